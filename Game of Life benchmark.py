@@ -0,0 +1,172 @@
+"""
+Benchmark suite for the Game of Life backends.
+
+Runs a fixed set of workloads (the mode 4 glider gun, the random soups of modes 1-3 and a board tiled with
+guns that is loaded through the rle parser) at several board sizes on every backend, and writes generations
+per second, cells per second and peak memory to a JSON file that can be compared across commits.
+
+example call: python "Game of Life benchmark.py" --sizes 128 1024 --backends numpy packed --output bench.json
+"""
+
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+
+def load_game_of_life():
+    """
+    import "Game of Life.py" (its file name is not a valid module name)
+    :return: the module
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Game of Life.py')
+    spec = importlib.util.spec_from_file_location('game_of_life', path)
+    module = importlib.util.module_from_spec(spec)
+    # registered so the parallel backend workers can unpickle its functions
+    sys.modules['game_of_life'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+GOSPER_GUN = """x = 36, y = 9, rule = B3/S23
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4b
+obo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+WORKLOADS = ['gun', 'soup1', 'soup2', 'soup3', 'rle']
+BACKENDS = ['numpy', 'packed', 'sparse', 'hashlife', 'parallel', 'loop']
+# the python loop backend is only a reference, larger boards would take hours
+MAX_SIZE = {'loop': 256}
+
+
+def tiled_gun_rle(gol, size):
+    """
+    an rle pattern of guns tiled over a size*size board
+    :param gol: the Game of Life module
+    :param size: board side
+    :return: rle string
+    """
+    tile = gol.GameOfLife(48, 0, 'B3/S23', GOSPER_GUN, (2, 2)).board
+    board = np.zeros((size, size), dtype=int)
+    for i in range(0, size - 47, 48):
+        for j in range(0, size - 47, 48):
+            board[i:i + 48, j:j + 48] = tile
+    return gol.board_to_rle(board, 'B3/S23')
+
+
+def make_game(gol, workload, size, backend, rle_cache):
+    """
+    build the start board of a workload
+    :return: GameOfLife
+    """
+    np.random.seed(0)
+    if workload == 'gun':
+        return gol.GameOfLife(size, 4, 'B3/S23', '', 0, backend=backend)
+    if workload == 'rle':
+        if size not in rle_cache:
+            rle_cache[size] = tiled_gun_rle(gol, size)
+        return gol.GameOfLife(size, 0, 'B3/S23', rle_cache[size], 0, backend=backend)
+    return gol.GameOfLife(size, int(workload[-1]), 'B3/S23', '', 0, backend=backend)
+
+
+def supported(workload, size, backend):
+    """
+    whether a backend can run a workload at a board size
+    :return: bool
+    """
+    if size > MAX_SIZE.get(backend, size):
+        return False
+    if backend == 'hashlife' and size & (size - 1):
+        return False
+    return size >= 48
+
+
+def measure(gol, workload, size, backend, generations, rle_cache):
+    """
+    time a workload, then measure its peak python/numpy memory on a short second run.
+    tracemalloc cannot see the worker processes and shared memory of the parallel backend, so its peak_bytes is
+    None and shared_memory_bytes holds the size of its two shared boards instead.
+    :return: dict with the results
+    """
+    start = time.perf_counter()
+    game = make_game(gol, workload, size, backend, rle_cache)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    game.advance(generations)
+    seconds = time.perf_counter() - start
+    if backend == 'parallel':
+        game.close()
+    del game
+
+    if backend == 'parallel':
+        peak, shared = None, 2 * size * size
+    else:
+        tracemalloc.start()
+        game = make_game(gol, workload, size, backend, rle_cache)
+        game.advance(min(generations, 2))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        shared = 0
+
+    return {'workload': workload, 'size': size, 'backend': backend, 'generations': generations,
+            'setup_seconds': setup, 'seconds': seconds,
+            'generations_per_second': generations / seconds if seconds else None,
+            'cells_per_second': generations * size * size / seconds if seconds else None,
+            'peak_bytes': peak, 'shared_memory_bytes': shared}
+
+
+def git_commit():
+    """
+    the current commit hash, None outside a git checkout
+    :return: str or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, backends, workloads, generations, output):
+    """
+    run every supported (workload, size, backend) combination and write the JSON report
+    :return: the report dict
+    """
+    gol = load_game_of_life()
+    rle_cache = {}
+    results = []
+    for workload in workloads:
+        for size in sizes:
+            for backend in backends:
+                if not supported(workload, size, backend):
+                    continue
+                result = measure(gol, workload, size, backend, generations, rle_cache)
+                results.append(result)
+                memory = result['peak_bytes'] if result['peak_bytes'] is not None else result['shared_memory_bytes']
+                print(f"{workload:6} {size:6} {backend:9} {result['generations_per_second']:12.2f} gen/s "
+                      f"{result['cells_per_second']:14.0f} cells/s {memory / 2 ** 20:9.1f} MB"
+                      f"{' shared' if result['peak_bytes'] is None else ''}")
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+              'cpu_count': os.cpu_count(), 'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 512, 2048, 8192])
+    parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+    parser.add_argument('--workloads', nargs='+', default=WORKLOADS, choices=WORKLOADS)
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--output', type=str, default='game_of_life_benchmark.json')
+    args = parser.parse_args()
+    run_benchmarks(args.sizes, args.backends, args.workloads, args.generations, args.output)
@@ -6,17 +6,660 @@
 import matplotlib.pyplot as plt
 import game_of_life_interface
 import numpy as np
+from collections import OrderedDict, deque
+import hashlib
+from multiprocessing import Pool, shared_memory
+import os
+import queue
+import re
+import threading
+import time
+import weakref
+
+
+def parse_rules(rules):
+    """
+    compile a Life-like rulestring into a birth/survival lookup table.
+    accepts "B3/S23", the S/B/C Generations notation ("/2/3") and labeled Generations rules ("B2/S/C3").
+    :param rules: the rulestring
+    :return: (table, n_states) - table is an 18 entry uint8 array indexed by state*9+neighbors (state 0 dead,
+     1 alive) that holds 1 if the cell is alive on the next generation, n_states is the number of cell states
+    """
+    birth, survival, n_states = '', '', 2
+    # unlabeled parts are read by position in the S/B/C order
+    for position, part in enumerate(rules.strip().split('/')):
+        label = part[:1].upper()
+        if label.isalpha():
+            part = part[1:]
+        else:
+            label = 'SBC'[position] if position < 3 else ''
+        if not part.isdigit() and part != '':
+            raise ValueError(f"bad rulestring {rules!r}")
+        if label == 'B':
+            birth = part
+        elif label == 'S':
+            survival = part
+        elif label in ('C', 'G') and part != '':
+            n_states = int(part)
+        else:
+            raise ValueError(f"bad rulestring {rules!r}")
+    if any(c == '9' for c in birth + survival) or not 2 <= n_states < 255:
+        raise ValueError(f"bad rulestring {rules!r}")
+
+    table = np.zeros(18, dtype=np.uint8)
+    table[[int(c) for c in birth]] = 1
+    table[[9 + int(c) for c in survival]] = 1
+    return table, n_states
+
+
+def rle_lines(rle):
+    """
+    the lines of an rle pattern, read lazily when rle is the name of a pattern file
+    :param rle: rle string or file name
+    :return: iterator over the lines
+    """
+    if '\n' not in rle and rle.endswith('.rle') and os.path.isfile(rle):
+        with open(rle) as f:
+            yield from f
+    else:
+        yield from rle.splitlines()
+
+
+RLE_HEADER_FIELD = re.compile(r',\s*(?=[A-Za-z]\w*\s*=)')
+
+
+def read_rle_header(rle):
+    """
+    read the 'x = m, y = n, rule = B3/S23' header line of an rle pattern
+    :param rle: rle string or file name
+    :return: dict with the header fields ('x' and 'y' as ints, the rule without a ':T' grid suffix), empty if
+     there is no header
+    """
+    for line in rle_lines(rle):
+        line = line.strip()
+        if line == '' or line.startswith('#'):
+            continue
+        if not line.startswith('x'):
+            return {}
+        header = {}
+        # split only where a new 'key =' starts, values like 'B3/S23:T100,100' contain commas
+        for field in RLE_HEADER_FIELD.split(line):
+            key, _, value = field.partition('=')
+            header[key.strip()] = value.strip()
+        for key in ('x', 'y'):
+            if key in header:
+                header[key] = int(header[key])
+        if 'rule' in header:
+            rule, _, topology = header['rule'].partition(':')
+            # the board is always a torus of its own size, so only a torus grid suffix can be dropped
+            if topology and not topology.upper().startswith('T'):
+                raise ValueError(f"unsupported bounded grid {topology!r} in rule {header['rule']!r}, "
+                                 f"only toroidal ':T' grids are supported")
+            header['rule'] = rule
+        return header
+    return {}
+
+
+RLE_TOKEN = re.compile(r'(\d*)([^\d\s])')
+
+
+def iter_rle_runs(rle):
+    """
+    stream the runs of an rle pattern without expanding it.
+    'b' and '.' are dead cells, 'o' and 'A' alive cells, 'B'..'X' the dying states of Generations patterns.
+    :param rle: rle string or file name
+    :return: iterator of (row, col, count, state) for every run of non dead cells, state 1 is alive
+    """
+    row = col = 0
+    carry = ''
+    for line in rle_lines(rle):
+        line = line.strip()
+        if line.startswith('#') or (line.startswith('x') and row == col == 0 and carry == ''):
+            continue
+        line = carry + line
+        digits = len(line) - len(line.rstrip('0123456789'))
+        line, carry = line[:len(line) - digits], line[len(line) - digits:]
+        for match in RLE_TOKEN.finditer(line):
+            count = int(match.group(1) or 1)
+            tag = match.group(2)
+            if tag == '!':
+                return
+            if tag == '$':
+                row += count
+                col = 0
+                continue
+            if tag not in 'b.':
+                state = 1 if tag in 'oA' or not tag.isupper() else ord(tag) - ord('A') + 1
+                yield row, col, count, state
+            col += count
+
+
+def board_to_rle(board, rules, n_states=2, width=70):
+    """
+    encode the bounding box of a board as an rle pattern
+    :param board: N*N board
+    :param rules: the rulestring written to the header
+    :param n_states: number of cell states, Generations patterns use '.', 'A', 'B'.. tags
+    :param width: max line length
+    :return: rle string
+    """
+    board = np.asarray(board)
+    rows, cols = np.nonzero(board)
+    if len(rows) == 0:
+        return f"x = 0, y = 0, rule = {rules}\n!\n"
+    top, left = rows.min(), cols.min()
+    box = board[top:rows.max() + 1, left:cols.max() + 1]
+    states = np.where(box == 255, 1, box)
+    tags = '.' + ''.join(chr(ord('A') + k) for k in range(n_states - 1)) if n_states > 2 else 'bo'
+
+    tokens = []
+    empty_rows = 0
+    for line in states:
+        live = np.nonzero(line)[0]
+        if len(live) == 0:
+            empty_rows += 1
+            continue
+        if tokens or empty_rows:
+            tokens.append(f"{empty_rows + 1 if empty_rows else ''}$")
+        empty_rows = 0
+        line = line[:live[-1] + 1]
+        starts = np.concatenate(([0], np.nonzero(np.diff(line))[0] + 1))
+        ends = np.append(starts[1:], len(line))
+        for start, end in zip(starts, ends):
+            count = end - start
+            tokens.append(f"{count if count > 1 else ''}{tags[line[start]]}")
+    tokens.append('!')
+
+    lines = [f"x = {box.shape[1]}, y = {box.shape[0]}, rule = {rules}"]
+    current = ''
+    for token in tokens:
+        if len(current) + len(token) > width:
+            lines.append(current)
+            current = ''
+        current += token
+    lines.append(current)
+    return '\n'.join(lines) + '\n'
+
+
+# the live cells of the mode 4 start board, a Gosper glider gun
+GLIDER_GUN_CELLS = ((14, 11), (15, 11), (14, 10), (15, 10), (14, 20), (15, 20), (16, 20), (13, 21), (17, 21),
+                    (12, 22), (18, 22), (12, 23), (18, 23), (15, 24), (13, 25), (17, 25), (14, 26), (15, 26),
+                    (16, 26), (15, 27), (12, 30), (13, 30), (14, 30), (12, 31), (13, 31), (14, 31), (11, 32),
+                    (15, 32), (10, 34), (11, 34), (15, 34), (16, 34), (12, 44), (13, 44), (12, 45), (13, 45))
+
+
+def pack_board(board):
+    """
+    pack a N*N board of 0/255 values into one bit per cell.
+    cell j of a row is bit j%64 of word j//64, the padding bits of the last word are kept at zero.
+    :param board: N*N board
+    :return: N*ceil(N/64) uint64 array
+    """
+    alive = np.asarray(board) == 255
+    rows, cols = alive.shape
+    words = -(-cols // 64)
+    padded = np.zeros((rows, words * 64), dtype=bool)
+    padded[:, :cols] = alive
+    packed = np.packbits(padded, axis=1, bitorder='little')
+    return packed.view('<u8').astype(np.uint64)
+
+
+def set_packed_cells(row, start, stop):
+    """
+    set the cells start..stop-1 of one packed row alive
+    :param row: ceil(N/64) uint64 words of a row made by pack_board
+    :param start: first column
+    :param stop: column after the last one
+    :return: None
+    """
+    if stop <= start:
+        return
+    first, last = start // 64, (stop - 1) // 64
+    low, high = start % 64, (stop - 1) % 64 + 1
+    if first == last:
+        row[first] |= np.uint64(((1 << high) - 1) ^ ((1 << low) - 1))
+        return
+    row[first] |= np.uint64(((1 << 64) - 1) ^ ((1 << low) - 1))
+    row[first + 1:last] = np.uint64((1 << 64) - 1)
+    row[last] |= np.uint64((1 << high) - 1)
+
+
+def unpack_board(packed, cols):
+    """
+    expand a packed board back to 0/255 values
+    :param packed: rows*words uint64 array made by pack_board
+    :param cols: the number of real columns in a row
+    :return: rows*cols int array of 0/255 values
+    """
+    raw = np.ascontiguousarray(packed, dtype='<u8').view(np.uint8)
+    alive = np.unpackbits(raw, axis=1, count=cols, bitorder='little')
+    return alive.astype(int) * 255
+
+
+def next_generation(board, neighbors, rule_table, n_states):
+    """
+    compute the next generation from a board and its neighbor counts with a compiled rule table.
+    on Generations rules a dying cell keeps its state number (2..n_states-1) as its board value.
+    :param board: board of any shape
+    :param neighbors: live neighbor counts of the same shape
+    :param rule_table: table made by parse_rules
+    :param n_states: number of cell states
+    :return: the next board, with the dtype of the input board
+    """
+    board = np.asarray(board)
+    alive = board == 255
+    next_alive = rule_table[alive * np.uint8(9) + neighbors]
+    next_board = np.zeros(board.shape, dtype=board.dtype)
+    next_board[next_alive == 1] = 255
+    if n_states > 2:
+        dying = (board != 0) & ~alive
+        next_board[alive & (next_alive == 0)] = 2
+        aged = board[dying] + 1
+        next_board[dying] = np.where(aged < n_states, aged, 0)
+    return next_board
+
+
+# state of a parallel stepping worker process, set by init_band_worker
+band_worker = {}
+
+
+def init_band_worker(names, shape, rule_table, n_states):
+    """
+    attach a worker process to the two shared memory board buffers
+    :param names: shared memory names of the two buffers
+    :param shape: the board shape
+    :param rule_table: table made by parse_rules
+    :param n_states: number of cell states
+    :return: None
+    """
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    band_worker['buffers'] = buffers
+    band_worker['boards'] = [np.ndarray(shape, dtype=np.uint8, buffer=b.buf) for b in buffers]
+    band_worker['rules'] = (rule_table, n_states)
+
+
+def release_shared_board(pool, buffers):
+    """
+    stop the worker pool and free the shared board buffers of the parallel backend. run by GameOfLife.close or,
+    through weakref.finalize, when the game is garbage collected or the interpreter exits
+    :param pool: the worker pool
+    :param buffers: the shared memory buffers
+    :return: None
+    """
+    pool.close()
+    pool.join()
+    for buffer in buffers:
+        try:
+            buffer.close()
+        except BufferError:
+            # a board view is still referenced somewhere, the segment is unlinked anyway
+            pass
+        buffer.unlink()
+
+
+def step_band(task):
+    """
+    compute the next generation of a horizontal band of rows, reading one halo row above and below with wraparound
+    :param task: (source buffer index, first row, end row)
+    :return: None
+    """
+    source, start, stop = task
+    src = band_worker['boards'][source]
+    dst = band_worker['boards'][1 - source]
+    N = src.shape[0]
+    band = src.take(np.arange(start - 1, stop + 1) % N, axis=0)
+    alive = (band == 255).astype(np.uint8)
+    rows = alive[:-2] + alive[1:-1] + alive[2:]
+    neighbors = rows + np.roll(rows, 1, axis=1) + np.roll(rows, -1, axis=1) - alive[1:-1]
+    dst[start:stop] = next_generation(band[1:-1], neighbors, *band_worker['rules'])
+
+
+class QuadNode:
+    """
+    a hash-consed quadtree node. level 0 nodes are single cells, a level L node is a 2^L*2^L square.
+    nodes are created only through HashLife.join so equal squares are the same object.
+    """
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+
+
+class HashLife:
+    """
+    HashLife engine for a 2^k*2^k torus. a generation jump of 2^j (j < k) joins four copies of the torus into
+    one periodic node twice its size, whose memoized center result is the torus rolled by half a side.
+    """
+    def __init__(self, rule_table, cache_size=1 << 20):
+        self.rule_table = rule_table
+        self.cache_size = cache_size
+        self.dead = QuadNode(0, None, None, None, None, 0)
+        self.alive = QuadNode(0, None, None, None, None, 1)
+        self.nodes = {}
+        self.results = OrderedDict()
+        self.root = None
+
+    def join(self, nw, ne, sw, se):
+        """
+        the unique node with the given quadrants
+        :return: QuadNode one level above the quadrants
+        """
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+        if node is None:
+            node = QuadNode(nw.level + 1, nw, ne, sw, se,
+                            nw.population + ne.population + sw.population + se.population)
+            self.nodes[key] = node
+        return node
+
+    def collect(self):
+        """
+        evict the intern table down to the nodes reachable from the root and drop the results cache
+        :return: None
+        """
+        self.nodes = {}
+        self.results.clear()
+        seen = set()
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if node.level == 0 or id(node) in seen:
+                continue
+            seen.add(id(node))
+            self.nodes[(node.nw, node.ne, node.sw, node.se)] = node
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+
+    def from_board(self, board):
+        """
+        build the quadtree of a square 0/255 board whose side is a power of two, bottom-up
+        :param board: N*N board
+        :return: QuadNode of level log2(N)
+        """
+        alive = np.asarray(board) == 255
+        cells = (self.dead, self.alive)
+        # level 1 nodes by their 4 bit code (nw, ne, sw, se)
+        codes = alive[0::2, 0::2] * 1 + alive[0::2, 1::2] * 2 + alive[1::2, 0::2] * 4 + alive[1::2, 1::2] * 8
+        leaves = [self.join(cells[c & 1], cells[c >> 1 & 1], cells[c >> 2 & 1], cells[c >> 3 & 1]) for c in range(16)]
+        level = [[leaves[c] for c in row] for row in codes.tolist()]
+        while len(level) > 1:
+            level = [[self.join(level[i][j], level[i][j + 1], level[i + 1][j], level[i + 1][j + 1])
+                      for j in range(0, len(level), 2)] for i in range(0, len(level), 2)]
+        return level[0][0]
+
+    def to_board(self, node):
+        """
+        expand a node to a 0/255 board
+        :param node: QuadNode
+        :return: 2^L*2^L int array
+        """
+        side = 1 << node.level
+        board = np.zeros((side, side), dtype=int)
+        stack = [(node, 0, 0)]
+        while stack:
+            node, row, col = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                board[row, col] = 255
+                continue
+            half = 1 << (node.level - 1)
+            stack.extend(((node.nw, row, col), (node.ne, row, col + half),
+                          (node.sw, row + half, col), (node.se, row + half, col + half)))
+        return board
+
+    def base(self, node):
+        """
+        one generation of the center 2*2 of a level 2 node
+        :param node: level 2 QuadNode
+        :return: level 1 QuadNode
+        """
+        rows = ((node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne),
+                (node.nw.sw, node.nw.se, node.ne.sw, node.ne.se),
+                (node.sw.nw, node.sw.ne, node.se.nw, node.se.ne),
+                (node.sw.sw, node.sw.se, node.se.sw, node.se.se))
+        cells = []
+        for i in (1, 2):
+            for j in (1, 2):
+                neighbors = sum(rows[i + di][j + dj].population
+                                for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj)
+                state = rows[i][j].population
+                cells.append(self.alive if self.rule_table[state * 9 + neighbors] else self.dead)
+        return self.join(*cells)
+
+    def step(self, node, j):
+        """
+        the center half of a node after 2^j generations (j <= level-2), memoized
+        :param node: QuadNode of level L >= 2
+        :param j: log2 of the number of generations
+        :return: QuadNode of level L-1
+        """
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            return result
+        if node.level == 2:
+            result = self.base(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            parts = [nw, self.join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                     self.join(nw.sw, nw.se, sw.nw, sw.ne), self.join(nw.se, ne.sw, sw.ne, se.nw),
+                     self.join(ne.sw, ne.se, se.nw, se.ne),
+                     sw, self.join(sw.ne, se.nw, sw.se, se.sw), se]
+            full = j == node.level - 2
+            if full:
+                parts = [self.step(part, j - 1) for part in parts]
+            else:
+                parts = [self.join(p.nw.se, p.ne.sw, p.sw.ne, p.se.nw) for p in parts]
+            inner = j - 1 if full else j
+            result = self.join(
+                self.step(self.join(parts[0], parts[1], parts[3], parts[4]), inner),
+                self.step(self.join(parts[1], parts[2], parts[4], parts[5]), inner),
+                self.step(self.join(parts[3], parts[4], parts[6], parts[7]), inner),
+                self.step(self.join(parts[4], parts[5], parts[7], parts[8]), inner))
+        self.results[key] = result
+        if len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+        return result
+
+    def jump(self, j):
+        """
+        advance the torus by 2^j generations, j < log2 of the board side
+        :param j: log2 of the number of generations
+        :return: None
+        """
+        root = self.root
+        rolled = self.step(self.join(root, root, root, root), j)
+        # the result is the torus shifted by half a side, swapping the quadrants diagonally shifts it back
+        self.root = self.join(rolled.se, rolled.sw, rolled.ne, rolled.nw)
+        if len(self.nodes) > 4 * self.cache_size:
+            self.collect()
+
+    def advance(self, generations):
+        """
+        advance the torus by any number of generations with the largest jumps possible
+        :param generations: number of generations
+        :return: None
+        """
+        max_j = self.root.level - 1
+        while generations > 0:
+            j = min(max_j, generations.bit_length() - 1)
+            self.jump(j)
+            generations -= 1 << j
+
+
+class ChunkedPlane:
+    """
+    an unbounded plane stored as a dict of chunk_size*chunk_size uint8 chunks keyed by chunk coordinates.
+    chunks are allocated when a pattern grows into them and freed when they die out, so memory follows the
+    population instead of the bounding box.
+    """
+    # (chunk offset, slice of the neighbor chunk, slice of the padded block) for the edges and corners
+    borders = (((-1, 0), (-1, slice(None)), (0, slice(1, -1))), ((1, 0), (0, slice(None)), (-1, slice(1, -1))),
+               ((0, -1), (slice(None), -1), (slice(1, -1), 0)), ((0, 1), (slice(None), 0), (slice(1, -1), -1)),
+               ((-1, -1), (-1, -1), (0, 0)), ((-1, 1), (-1, 0), (0, -1)),
+               ((1, -1), (0, -1), (-1, 0)), ((1, 1), (0, 0), (-1, -1)))
+
+    def __init__(self, rule_table, n_states, chunk_size=64):
+        if rule_table[0]:
+            raise ValueError("B0 rules fill the whole plane and cannot run unbounded")
+        self.rule_table = rule_table
+        self.n_states = n_states
+        self.chunk_size = chunk_size
+        self.chunks = {}
+
+    def load(self, board, row=0, col=0):
+        """
+        add the non dead cells of a board with its top left corner at (row, col)
+        :param board: 2D board
+        :return: None
+        """
+        C = self.chunk_size
+        board = np.asarray(board)
+        rows, cols = np.nonzero(board)
+        for i, j, value in zip(rows + row, cols + col, board[rows, cols]):
+            key = (i // C, j // C)
+            if key not in self.chunks:
+                self.chunks[key] = np.zeros((C, C), dtype=np.uint8)
+            self.chunks[key][i % C, j % C] = value
+
+    def step(self):
+        """
+        one generation. an empty chunk is only computed when a neighbor chunk has live cells on the shared border.
+        :return: None
+        """
+        C = self.chunk_size
+        candidates = set(self.chunks)
+        for (ci, cj), chunk in self.chunks.items():
+            for (di, dj), edge, _ in self.borders:
+                key = (ci - di, cj - dj)
+                if key not in candidates and (chunk[edge] == 255).any():
+                    candidates.add(key)
+
+        chunks = {}
+        empty = np.zeros((C, C), dtype=np.uint8)
+        for ci, cj in candidates:
+            block = np.zeros((C + 2, C + 2), dtype=np.uint8)
+            block[1:-1, 1:-1] = self.chunks.get((ci, cj), empty)
+            for (di, dj), edge, target in self.borders:
+                neighbor = self.chunks.get((ci + di, cj + dj))
+                if neighbor is not None:
+                    block[target] = neighbor[edge]
+            alive = (block == 255).view(np.uint8)
+            neighbors = (alive[:-2, :-2] + alive[:-2, 1:-1] + alive[:-2, 2:] + alive[1:-1, :-2] +
+                         alive[1:-1, 2:] + alive[2:, :-2] + alive[2:, 1:-1] + alive[2:, 2:])
+            chunk = next_generation(block[1:-1, 1:-1], neighbors, self.rule_table, self.n_states)
+            if chunk.any():
+                chunks[(ci, cj)] = chunk
+        self.chunks = chunks
+
+    def window(self, row, col, height, width):
+        """
+        a dense copy of part of the plane
+        :return: height*width int array
+        """
+        C = self.chunk_size
+        board = np.zeros((height, width), dtype=int)
+        for (ci, cj), chunk in self.chunks.items():
+            top, left = ci * C - row, cj * C - col
+            r0, c0 = max(top, 0), max(left, 0)
+            r1, c1 = min(top + C, height), min(left + C, width)
+            if r0 < r1 and c0 < c1:
+                board[r0:r1, c0:c1] = chunk[r0 - top:r1 - top, c0 - left:c1 - left]
+        return board
+
+    def live_cells(self):
+        """
+        coordinates of every non dead cell
+        :return: (rows, cols) int arrays
+        """
+        C = self.chunk_size
+        rows, cols = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for (ci, cj), chunk in self.chunks.items():
+            i, j = np.nonzero(chunk)
+            rows.append(i + ci * C)
+            cols.append(j + cj * C)
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def bounding_box(self):
+        """
+        :return: (top, left, bottom, right) of the non dead cells, inclusive, or None on an empty plane
+        """
+        rows, cols = self.live_cells()
+        if len(rows) == 0:
+            return None
+        return int(rows.min()), int(cols.min()), int(rows.max()), int(cols.max())
+
+    def population(self):
+        """
+        :return: number of non dead cells
+        """
+        return sum(int(np.count_nonzero(chunk)) for chunk in self.chunks.values())
+
+    def digest(self):
+        """
+        :return: 16 byte hash of the chunk coordinates and contents
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(self.chunks):
+            h.update(np.array(key, dtype=np.int64).tobytes())
+            h.update(self.chunks[key].tobytes())
+        return h.digest()
 
 
 class GameOfLife(game_of_life_interface.GameOfLife):
-    def __init__(self, size_of_board, board_start_mode, rules, rle, pattern_position):
+    def __init__(self, size_of_board, board_start_mode, rules, rle, pattern_position, backend='numpy',
+                 cache_size=1 << 20, tile_size=32, workers=None, max_period=0, profile=False, chunk_size=64):
         self.size_of_board=size_of_board
         self.board_start_mode=board_start_mode
         self.rules=rules
         self.rle=rle
         self.pattern_position=pattern_position
-        self.board=self.init_board()
-
+        if backend not in ('numpy', 'loop', 'packed', 'hashlife', 'sparse', 'parallel', 'unbounded'):
+            raise ValueError(f"unknown backend {backend!r}")
+        self.backend=backend
+        if rle != '' and board_start_mode == 0:
+            # the rule in the pattern header wins over the rules argument
+            self.rules = read_rle_header(rle).get('rule', rules)
+        self.rule_table, self.n_states = parse_rules(self.rules)
+        if backend in ('packed', 'hashlife') and self.n_states > 2:
+            raise ValueError(f"the {backend} backend supports two-state rules only")
+        if backend == 'packed':
+            self.board=self.init_packed_board()
+        elif backend == 'hashlife':
+            if size_of_board < 4 or size_of_board & (size_of_board - 1):
+                raise ValueError("the hashlife backend needs a power of two size_of_board")
+            self.hashlife = HashLife(self.rule_table, cache_size)
+            self.hashlife.root = self.hashlife.from_board(self.init_board())
+        elif backend == 'unbounded':
+            # the start board is placed at the origin of the plane, size_of_board is only the display window
+            self.plane = ChunkedPlane(self.rule_table, self.n_states, chunk_size)
+            self.plane.load(self.init_board())
+        else:
+            self.board=self.init_board()
+        if backend == 'parallel':
+            self.init_shared_board(workers)
+        if backend == 'sparse':
+            self.tile_size = tile_size
+            tiles = -(-size_of_board // tile_size)
+            # every tile is treated as changed before the first generation
+            self.changed_tiles = np.ones((tiles, tiles), dtype=bool)
+            self.tile_stats = {'changed': tiles * tiles, 'computed': 0, 'total': tiles * tiles}
+        self.generation = 0
+        # with profile on every update/jump appends {'generation', 'generations', 'seconds', 'population'}
+        self.profile = profile
+        self.profile_records = []
+        self.max_period = max_period
+        self.settled = None
+        if max_period:
+            self.history = deque()
+            self.seen = {}
+            self.record_generation()
 
     def update(self):
         """
@@ -24,34 +667,405 @@ class GameOfLife(game_of_life_interface.GameOfLife):
         Input None.
         Output None.
         """
-        N = self.size_of_board
-        # Get the game rules
-        rules = self.rules.split('/')
-        birth = rules[0]
-        survival = rules[1]
-        if len(birth) > 1:
-            birth = birth[1:]
+        start = time.perf_counter() if self.profile else 0.0
+        if self.backend == 'loop':
+            self.update_loop()
+        elif self.backend == 'packed':
+            self.update_packed()
+        elif self.backend == 'hashlife':
+            self.hashlife.advance(1)
+        elif self.backend == 'sparse':
+            self.update_sparse()
+        elif self.backend == 'parallel':
+            self.update_parallel()
+        elif self.backend == 'unbounded':
+            self.plane.step()
         else:
-            birth = '0'
-        if len(survival) > 1:
-            survival = survival[1:]
+            self.update_numpy()
+        self.generation += 1
+        if self.profile:
+            self.record_profile(1, time.perf_counter() - start)
+        if self.max_period:
+            self.record_generation()
+
+    def record_profile(self, generations, seconds):
+        """
+        append a profiling record for the last update or hashlife jump
+        :param generations: number of generations it ran
+        :param seconds: how long it took
+        :return: None
+        """
+        self.profile_records.append({'generation': self.generation, 'generations': generations,
+                                     'seconds': seconds, 'population': self.population()})
+
+    def advance(self, generations, stop_when_settled=False):
+        """
+        advance the board by a number of generations. the hashlife backend jumps 2^k generations at a time
+        unless cycle detection is on, which needs every generation.
+        :param generations: number of generations
+        :param stop_when_settled: stop early once the board died out or became periodic
+        :return: the number of generations run
+        """
+        if self.backend == 'hashlife' and not self.max_period:
+            start = time.perf_counter()
+            self.hashlife.advance(generations)
+            self.generation += generations
+            if self.profile:
+                self.record_profile(generations, time.perf_counter() - start)
+            return generations
+        for done in range(generations):
+            if stop_when_settled and self.settled:
+                return done
+            self.update()
+        return generations
+
+    def board_hash(self):
+        """
+        hash of the current generation, taken over the packed cells (or the cell states on Generations rules)
+        :return: 16 byte digest
+        """
+        if self.backend == 'unbounded':
+            return self.plane.digest()
+        if self.backend == 'packed':
+            data = self.board.tobytes()
+        elif self.n_states > 2:
+            data = np.asarray(self.dense_board(), dtype=np.uint8).tobytes()
         else:
-            survival = '0'
+            data = np.packbits(np.asarray(self.dense_board()) == 255).tobytes()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def population(self):
+        """
+        number of cells that are not dead
+        :return: int
+        """
+        if self.backend == 'packed':
+            return int(np.bitwise_count(self.board).sum())
+        if self.backend == 'hashlife':
+            return self.hashlife.root.population
+        if self.backend == 'unbounded':
+            return self.plane.population()
+        return int(np.count_nonzero(self.dense_board()))
+
+    def record_generation(self):
+        """
+        add the current generation to the bounded hash history and detect extinction, still lifes and
+        oscillators with a period up to max_period. the result is kept in self.settled as a dict with
+        'status' ('extinct', 'still life' or 'oscillator'), 'period' and 'generation' (when it was first seen).
+        :return: None
+        """
+        if self.settled:
+            return
+        if self.rule_table[0] == 0 and self.population() == 0:
+            self.settled = {'status': 'extinct', 'period': 1, 'generation': self.generation}
+            return
+        digest = self.board_hash()
+        if digest in self.seen:
+            period = self.generation - self.seen[digest]
+            self.settled = {'status': 'still life' if period == 1 else 'oscillator', 'period': period,
+                            'generation': self.seen[digest]}
+            return
+        self.history.append(digest)
+        self.seen[digest] = self.generation
+        if len(self.history) > self.max_period:
+            del self.seen[self.history.popleft()]
+
+    def run(self, generations, snapshot_every=0, output=None, frame_format='png', queue_size=8,
+            stop_when_settled=False):
+        """
+        run the game without a display and stream snapshots to disk while it runs.
+        a '.npy' output is a memory mapped (frames, N, N) uint8 stack written in place, any other output is a
+        directory that gets one image per snapshot from a background writer thread.
+        :param generations: number of generations to run
+        :param snapshot_every: take a snapshot every this many generations (and at generation 0), 0 for none
+        :param output: '.npy' file name or frames directory
+        :param frame_format: image format of the frames ('png' or 'gif')
+        :param queue_size: max number of frames waiting for the writer thread
+        :param stop_when_settled: stop early once cycle detection (max_period) finds the board settled, the
+         unused frames of a '.npy' stack are left empty
+        :return: the number of snapshots taken
+        """
+        if not snapshot_every or output is None:
+            self.advance(generations, stop_when_settled)
+            return 0
+        frames = generations // snapshot_every + 1
+
+        if output.endswith('.npy'):
+            N = self.size_of_board
+            stack = np.lib.format.open_memmap(output, mode='w+', dtype=np.uint8, shape=(frames, N, N))
+            written = 0
+            for frame in range(frames):
+                if frame and self.advance(snapshot_every, stop_when_settled) < snapshot_every:
+                    break
+                stack[frame] = self.dense_board()
+                written += 1
+            stack.flush()
+            del stack
+            if written == frames:
+                self.advance(generations - (frames - 1) * snapshot_every, stop_when_settled)
+            return written
+
+        os.makedirs(output, exist_ok=True)
+        pending = queue.Queue(maxsize=queue_size)
+        errors = []
+
+        def write_frames():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                if errors:
+                    continue
+                frame, board = item
+                try:
+                    plt.imsave(os.path.join(output, f"{frame:06d}.{frame_format}"), board, format=frame_format)
+                except Exception as e:
+                    errors.append(e)
+
+        writer = threading.Thread(target=write_frames, daemon=True)
+        writer.start()
+        written = 0
+        try:
+            for frame in range(frames):
+                if frame and self.advance(snapshot_every, stop_when_settled) < snapshot_every:
+                    break
+                pending.put((frame, np.array(self.dense_board(), dtype=np.uint8)))
+                written += 1
+                if errors:
+                    break
+        finally:
+            pending.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+        if written == frames:
+            self.advance(generations - (frames - 1) * snapshot_every, stop_when_settled)
+        return written
+
+    def dense_board(self):
+        """
+        the board as a N*N array of 0/255 values, unpacked on demand on the packed and hashlife backends.
+        on the unbounded backend this is the N*N window at the origin of the plane.
+        :return: N*N board
+        """
+        if self.backend == 'unbounded':
+            return self.plane.window(0, 0, self.size_of_board, self.size_of_board)
+        if self.backend == 'packed':
+            return unpack_board(self.board, self.size_of_board)
+        if self.backend == 'hashlife':
+            return self.hashlife.to_board(self.hashlife.root)
+        return self.board
+
+    def count_neighbors(self, board):
+        """
+        count the live neighbors of every cell at once, with toroidal wraparound
+        :param board: N*N board of 0/255 values
+        :return: N*N int array with the number of live neighbors (0-8) of each cell
+        """
+        alive = (np.asarray(board) == 255).astype(np.uint8)
+        # sum the row above, the row itself and the row below, then do the same over columns
+        rows = alive + np.roll(alive, 1, axis=0) + np.roll(alive, -1, axis=0)
+        total = rows + np.roll(rows, 1, axis=1) + np.roll(rows, -1, axis=1)
+        return total - alive
+
+    def apply_rules(self, board, neighbors):
+        """
+        compute the next generation from the board and its neighbor counts with the compiled rule table
+        :param board: N*N board
+        :param neighbors: N*N live neighbor counts
+        :return: the next N*N board
+        """
+        return next_generation(board, neighbors, self.rule_table, self.n_states)
+
+    def update_numpy(self):
+        """
+        vectorized single iteration - the neighbor sums of the whole board are computed with shifted arrays
+        :return: None
+        """
+        self.board = self.apply_rules(self.board, self.count_neighbors(self.board))
+
+    def update_sparse(self):
+        """
+        single iteration that recomputes only the tiles that changed last generation and their neighbors.
+        a cell whose 3*3 neighborhood did not change keeps its state, so the rest of the board is left untouched.
+        :return: None
+        """
+        N = self.size_of_board
+        ts = self.tile_size
+        changed = self.changed_tiles
+        needed = changed.copy()
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if di or dj:
+                    needed |= np.roll(changed, (di, dj), axis=(0, 1))
+
+        updates = []
+        for ti, tj in np.argwhere(needed):
+            r0, c0 = ti * ts, tj * ts
+            r1, c1 = min(r0 + ts, N), min(c0 + ts, N)
+            # the tile with a one cell halo, wrapped around the torus
+            block = self.board[np.ix_(np.arange(r0 - 1, r1 + 1) % N, np.arange(c0 - 1, c1 + 1) % N)]
+            alive = (block == 255).astype(np.uint8)
+            neighbors = (alive[:-2, :-2] + alive[:-2, 1:-1] + alive[:-2, 2:] + alive[1:-1, :-2] +
+                         alive[1:-1, 2:] + alive[2:, :-2] + alive[2:, 1:-1] + alive[2:, 2:])
+            tile = block[1:-1, 1:-1]
+            next_tile = self.apply_rules(tile, neighbors)
+            if not np.array_equal(next_tile, tile):
+                updates.append((ti, tj, r0, r1, c0, c1, next_tile))
+
+        self.changed_tiles = np.zeros_like(changed)
+        for ti, tj, r0, r1, c0, c1, next_tile in updates:
+            self.board[r0:r1, c0:c1] = next_tile
+            self.changed_tiles[ti, tj] = True
+        self.tile_stats = {'changed': len(updates), 'computed': int(needed.sum()), 'total': needed.size}
+
+    def init_shared_board(self, workers):
+        """
+        move the board into two shared memory buffers (current and next generation) and start the worker pool
+        :param workers: number of worker processes, defaults to the number of cores
+        :return: None
+        """
+        N = self.size_of_board
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_buffers = [shared_memory.SharedMemory(create=True, size=max(N * N, 1)) for _ in range(2)]
+        self.shared_boards = [np.ndarray((N, N), dtype=np.uint8, buffer=b.buf) for b in self.shared_buffers]
+        self.shared_boards[0][:] = self.board
+        self.current = 0
+        self.board = self.shared_boards[0]
+        self.pool = Pool(self.workers, init_band_worker,
+                         ([b.name for b in self.shared_buffers], (N, N), self.rule_table, self.n_states))
+        self.release = weakref.finalize(self, release_shared_board, self.pool, self.shared_buffers)
+        # a few bands per worker keeps the pool busy when bands take different times
+        edges = np.linspace(0, N, min(N, 4 * self.workers) + 1).astype(int)
+        self.bands = [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+    def update_parallel(self):
+        """
+        single iteration split into horizontal bands that the worker pool computes straight in shared memory
+        :return: None
+        """
+        self.pool.map(step_band, [(self.current, start, stop) for start, stop in self.bands])
+        self.current = 1 - self.current
+        self.board = self.shared_boards[self.current]
+
+    def close(self):
+        """
+        stop the worker pool and free the shared memory of the parallel backend. the board is copied out first
+        and the game switches to the numpy backend, so it can keep running after close.
+        :return: None
+        """
+        if getattr(self, 'pool', None) is None:
+            return
+        self.board = np.array(self.board, dtype=int)
+        self.shared_boards = []
+        self.release()
+        self.pool = None
+        self.shared_buffers = []
+        self.backend = 'numpy'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update_loop(self):
+        """
+        reference single iteration - visits every cell in a python loop and reads the rulestring itself
+        instead of the compiled rule table, so comparing it with the other backends also checks parse_rules.
+        kept for equivalence tests.
+        :return: None
+        """
+        N = self.size_of_board
+        # Get the game rules, unlabeled parts are read by position in the S/B/C order
+        birth, survival, n_states = '', '', 2
+        for position, part in enumerate(self.rules.strip().split('/')):
+            if part[:1].isalpha():
+                label, digits = part[0].upper(), part[1:]
+            else:
+                label, digits = 'SBC'[position], part
+            if label == 'B':
+                birth = digits
+            elif label == 'S':
+                survival = digits
+            elif digits:
+                n_states = int(digits)
 
         next_board = np.zeros((N, N), dtype=int)
         for i, row in enumerate(self.board):
             for j, val in enumerate(row):
-                sum = int((self.board[i, (j - 1) % N] + self.board[i, (j + 1) % N] +
-                             self.board[(i - 1) % N, j] + self.board[(i + 1) % N, j] +
-                             self.board[(i - 1) % N, (j - 1) % N] + self.board[(i - 1) % N, (j + 1) % N] +
-                             self.board[(i + 1) % N, (j - 1) % N] + self.board[(i + 1) % N, (j + 1) % N]) / 255)
+                sum = 0
+                for di in (-1, 0, 1):
+                    for dj in (-1, 0, 1):
+                        if (di or dj) and self.board[(i + di) % N, (j + dj) % N] == 255:
+                            sum += 1
                 # game rules
-                if val == 255 and (str(sum) in survival):
-                    next_board[i][j] = 255
-                elif val == 0 and (str(sum) in birth):
-                    next_board[i][j] = 255
+                if val == 255:
+                    next_board[i][j] = 255 if str(sum) in survival else (2 if n_states > 2 else 0)
+                elif val == 0:
+                    next_board[i][j] = 255 if str(sum) in birth else 0
                 else:
-                    next_board[i][j] = 0
+                    next_board[i][j] = val + 1 if val + 1 < n_states else 0
+        self.board = next_board
+
+    def shift_columns(self, words, direction):
+        """
+        shift every packed row by one cell with toroidal wraparound.
+        :param words: N*W packed board
+        :param direction: 1 - bit j gets cell j-1 (the west neighbor), -1 - bit j gets cell j+1 (the east neighbor)
+        :return: N*W packed board
+        """
+        N = self.size_of_board
+        last_word, last_bit = np.uint64((N - 1) // 64), np.uint64((N - 1) % 64)
+        one, top = np.uint64(1), np.uint64(63)
+        if direction == 1:
+            shifted = (words << one) | (np.roll(words, 1, axis=1) >> top)
+            wrapped = (words[:, last_word] >> last_bit) & one
+            shifted[:, 0] = (shifted[:, 0] & ~one) | wrapped
+        else:
+            shifted = (words >> one) | (np.roll(words, -1, axis=1) << top)
+            wrapped = words[:, 0] & one
+            shifted[:, last_word] = (shifted[:, last_word] & ~(one << last_bit)) | (wrapped << last_bit)
+        if N % 64:
+            shifted[:, -1] &= (one << np.uint64(N % 64)) - one
+        return shifted
+
+    def update_packed(self):
+        """
+        single iteration on the bit-packed board. the eight neighbor planes are summed by a bitwise ripple
+        counter into four bit planes, so every operation handles 64 cells at once.
+        :return: None
+        """
+        board = self.board
+        west = self.shift_columns(board, 1)
+        east = self.shift_columns(board, -1)
+        planes = [west, east]
+        for row in (board, west, east):
+            planes.append(np.roll(row, 1, axis=0))
+            planes.append(np.roll(row, -1, axis=0))
+
+        counter = [np.zeros_like(board) for _ in range(4)]
+        for plane in planes:
+            carry = plane
+            for k in range(4):
+                counter[k], carry = counter[k] ^ carry, counter[k] & carry
+
+        next_board = np.zeros_like(board)
+        for count in range(9):
+            born, survive = self.rule_table[count], self.rule_table[9 + count]
+            if not born and not survive:
+                continue
+            match = ~np.zeros_like(board)
+            for k in range(4):
+                match &= counter[k] if (count >> k) & 1 else ~counter[k]
+            if born and survive:
+                next_board |= match
+            elif born:
+                next_board |= match & ~board
+            else:
+                next_board |= match & board
+        if self.size_of_board % 64:
+            next_board[:, -1] &= (np.uint64(1) << np.uint64(self.size_of_board % 64)) - np.uint64(1)
         self.board = next_board
 
     def save_board_to_file(self, file_name):
@@ -59,7 +1073,7 @@ class GameOfLife(game_of_life_interface.GameOfLife):
         Input img_name donates the file name. Is a string, for example file_name = '1000.png'
         Output a file with the name that donates filename.
         """
-        plt.imsave( file_name,self.board ,format="png")
+        plt.imsave( file_name,self.dense_board() ,format="png")
 
     def display_board(self):
         """ This method displays the current state of the game to the screen. You can use Matplotlib for this.
@@ -68,7 +1082,7 @@ class GameOfLife(game_of_life_interface.GameOfLife):
         """
         fig, ax = plt.subplots()
 
-        img = ax.imshow(self.board, interpolation='nearest')
+        img = ax.imshow(self.dense_board(), interpolation='nearest')
 
         plt.show()
 
@@ -79,7 +1093,7 @@ class GameOfLife(game_of_life_interface.GameOfLife):
         this function initiate the board with the starting values by the start mode
         :return: return the board
         """
-        board = []
+        board = np.zeros((self.size_of_board, self.size_of_board), dtype=int)
         N=self.size_of_board
         
         if self.rle != '' and self.board_start_mode == 0:
@@ -93,113 +1107,167 @@ class GameOfLife(game_of_life_interface.GameOfLife):
             board=np.random.choice([0,255],(N,N),p=[0.8,0.2])
         elif self.board_start_mode == 4:
             board = np.zeros((N,N),dtype=int)
-            board[14,11] = 255
-            board[15,11] = 255
-            board[14,10] = 255
-            board[15,10] = 255
-            board[14,20] = 255
-            board[15,20] = 255
-            board[16,20] = 255
-            board[13,21] = 255
-            board[17,21] = 255
-            board[12,22] = 255
-            board[18,22] = 255
-            board[12,23] = 255
-            board[18,23] = 255
-            board[15,24] = 255
-            board[13,25] = 255
-            board[17,25] = 255
-            board[14:17,26] = 255
-            board[15,27] = 255
-            board[12:15,30] = 255
-            board[12:15,31] = 255
-            board[11,32] = 255
-            board[15,32] = 255
-            board[10:12,34] = 255
-            board[15:17,34] = 255
-            board[12:14,44] = 255
-            board[12:14,45] = 255
+            for i, j in GLIDER_GUN_CELLS:
+                board[i, j] = 255
             
         return board
 
+    def init_packed_board(self):
+        """
+        initiate the packed board. the random start modes are drawn band by band, and the glider gun and the
+        runs of an rle pattern are set bit by bit, straight into the packed words so the full N*N board is never
+        held in memory.
+        :return: N*ceil(N/64) uint64 packed board
+        """
+        N = self.size_of_board
+        density = {1: 0.5, 2: 0.8, 3: 0.2}.get(self.board_start_mode)
+        if density is None:
+            board = np.zeros((N, -(-N // 64)), dtype=np.uint64)
+            if self.rle != '' and self.board_start_mode == 0:
+                if isinstance(self.pattern_position, (tuple, list)):
+                    x, y = self.pattern_position[0], self.pattern_position[1]
+                else:
+                    x = y = self.pattern_position
+                for row, col, count, state in iter_rle_runs(self.rle):
+                    i, j = x + row, y + col
+                    if i >= N:
+                        break
+                    # only alive cells are kept, two-state boards have no dying states
+                    if state == 1:
+                        set_packed_cells(board[i], j, min(j + count, N))
+            elif self.board_start_mode == 4:
+                for i, j in GLIDER_GUN_CELLS:
+                    set_packed_cells(board[i], j, j + 1)
+            return board
+        band = max(1, (1 << 24) // max(N, 1))
+        board = np.empty((N, -(-N // 64)), dtype=np.uint64)
+        for start in range(0, N, band):
+            rows = min(band, N - start)
+            board[start:start + rows] = pack_board(np.where(np.random.random((rows, N)) < density, 255, 0))
+        return board
+
     def return_board(self):
         """ This method returns a list of the board position. The board is a two-dimensional list that every
         cell donates if the cell is dead or alive. Dead will be donated with 0 while alive will be donated with 255.
         Input None.
         Output a list that holds the board with a size of size_of_board*size_of_board.
         """
-        return self.board.tolist()
-    
-    
-    def encode_rle(self,rle):
-        """
-        encode the rle string
-        :param rle:the rle string
-        :return: encoded rle string
-        """
-        num=''
-        rle_str = ""
-        for i in rle :  
-            if not i.isalpha() and i not in '$!':
-                num+=i
-            else:
-                rle_str += self.encode_sub_rle(i,num)
-                num = ''
-
-        rle_str = rle_str.replace('b','0')
-        rle_str = rle_str.replace('o','1') 
-        return rle_str            
-    
+        return self.dense_board().tolist()
     
     
-    def encode_sub_rle(self,letter,num):
-        """
-        this function gets a letter and replicate it 'num' times
-        :param letter: letter from the rle string (o or b)
-        :param num:the num of times we need to replicate the letter
-        :return: 'num' times letter replicate
-        """
-        rle_substr=''
-        
-        if num=='':
-            return letter
-        for i in range(int(num)):
-            rle_substr+=letter
-        return rle_substr
-    
     def transform_rle_to_matrix(self, rle):
         """ This method transforms an rle coded pattern to a two dimensional list that holds the pattern,
          Dead will be donated with 0 while alive will be donated with 255.
         Input an rle coded string.
         Output a two dimensional list that holds a pattern with a size of the bounding box of the pattern.
-        :param rle:the rle string
+        :param rle:the rle string or the name of a .rle pattern file, read as a stream
 
-        :return: board N*N after initiated with the rle string
+        :return: board N*N after initiated with the rle string, runs outside the board are clipped
         """
         N = self.size_of_board
-        x = self.pattern_position[0]
-        y = self.pattern_position[1]
-        encoded_rle_str = self.encode_rle(rle)
+        if isinstance(self.pattern_position, (tuple, list)):
+            x, y = self.pattern_position[0], self.pattern_position[1]
+        else:
+            x = y = self.pattern_position
         board = np.zeros((N,N),dtype=int)
-        k=0
-        for i in range(x,N+1):
-            for j in range(y,N+1):
-                if encoded_rle_str[k] == '!':
-                    break
-                if encoded_rle_str[k] == '$':
-                    k+=1
-                    break
-                board[i][j] = int(encoded_rle_str[k])
-                k+=1
-        # I initiated the board with 1 and 0 and here i replace 1 with 255
-        for i in range(x,N):
-            for j in range(y,N):
-                if board[i][j] == 1:
-                    board[i][j] = 255
-            
+        for row, col, count, state in iter_rle_runs(rle):
+            i, j = x + row, y + col
+            if i >= N:
+                break
+            if j < N:
+                board[i, j:j + count] = 255 if state == 1 else state
         return board
+
+    def export_rle(self, file_name=None):
+        """
+        encode the current board as an rle pattern with a header holding the rules
+        :param file_name: optional file to write the pattern to
+        :return: the rle string
+        """
+        rle = board_to_rle(self.dense_board(), self.rules, self.n_states)
+        if file_name is not None:
+            with open(file_name, 'w') as f:
+                f.write(rle)
+        return rle
         
 
+class GameOfLifeEnsemble:
+    """
+    many random boards of the same size and start mode simulated together as one (B, N, N) array.
+    board i is always drawn from its own child seed, so results do not depend on the chunk size.
+    """
+    densities = {1: 0.5, 2: 0.8, 3: 0.2}
+
+    def __init__(self, size_of_board, board_start_mode, rules, boards, seed=None, chunk_size=256):
+        if board_start_mode not in self.densities:
+            raise ValueError("an ensemble needs a random start mode (1, 2 or 3)")
+        self.size_of_board = size_of_board
+        self.board_start_mode = board_start_mode
+        self.rules = rules
+        self.rule_table, self.n_states = parse_rules(rules)
+        self.boards = boards
+        self.chunk_size = chunk_size
+        self.seeds = np.random.SeedSequence(seed).spawn(boards)
+
+    def init_boards(self, start, stop):
+        """
+        draw the start boards start..stop-1
+        :return: (stop-start, N, N) uint8 array of 0/255 values
+        """
+        N = self.size_of_board
+        density = self.densities[self.board_start_mode]
+        boards = np.empty((stop - start, N, N), dtype=np.uint8)
+        for k, seed in enumerate(self.seeds[start:stop]):
+            boards[k] = np.where(np.random.default_rng(seed).random((N, N)) < density, 255, 0)
+        return boards
+
+    def step(self, boards):
+        """
+        one generation of every board in a (B, N, N) batch, each board on its own torus
+        :param boards: (B, N, N) uint8 array
+        :return: the next (B, N, N) uint8 array
+        """
+        alive = (boards == 255).view(np.uint8)
+        rows = alive + np.roll(alive, 1, axis=1) + np.roll(alive, -1, axis=1)
+        neighbors = rows + np.roll(rows, 1, axis=2) + np.roll(rows, -1, axis=2) - alive
+        return next_generation(boards, neighbors, self.rule_table, self.n_states)
+
+    def run(self, generations, keep_final=False, out=None):
+        """
+        simulate every board for a number of generations, chunk_size boards at a time. only one chunk of boards
+        is held in memory unless the final boards are kept, pass a memory mapped out to keep them on disk.
+        :param generations: number of generations
+        :param keep_final: also return the final boards, in a new (B, N, N) array unless out is given
+        :param out: optional (B, N, N) uint8 array (e.g. np.memmap) the final boards are written to,
+         implies keep_final
+        :return: dict with 'population' ((B, generations+1) live cell counts), 'extinction' (first generation
+         with no live cells per board, -1 if it never died out) and 'final' ((B, N, N) boards or None)
+        """
+        N = self.size_of_board
+        population = np.zeros((self.boards, generations + 1), dtype=np.int64)
+        if out is not None:
+            if out.shape != (self.boards, N, N):
+                raise ValueError(f"out must have shape {(self.boards, N, N)}, got {out.shape}")
+            keep_final = True
+        final = out if out is not None else np.empty((self.boards, N, N), dtype=np.uint8) if keep_final else None
+        for start in range(0, self.boards, self.chunk_size):
+            stop = min(start + self.chunk_size, self.boards)
+            boards = self.init_boards(start, stop)
+            population[start:stop, 0] = np.count_nonzero(boards, axis=(1, 2))
+            for generation in range(1, generations + 1):
+                boards = self.step(boards)
+                population[start:stop, generation] = np.count_nonzero(boards, axis=(1, 2))
+            if keep_final:
+                final[start:stop] = boards
+
+        extinction = np.full(self.boards, -1, dtype=np.int64)
+        if self.rule_table[0] == 0:
+            dead = population == 0
+            died = dead.any(axis=1)
+            extinction[died] = dead[died].argmax(axis=1)
+        return {'population': population, 'extinction': extinction, 'final': final}
+
+
 if __name__ == '__main__':  # You should keep this line for our auto-grading code.
 
     size_of_board = 100
@@ -0,0 +1,132 @@
+"""
+Scaling benchmarks for the PortfolioBuilder strategies on synthetic market data.
+
+Runs find_universal_portfolio and find_exponential_gradient_portfolio over grids of days, tickers and
+portfolio_quantization on seeded correlated geometric brownian motion prices (no network needed), and writes
+the runtime and peak memory of every run to a JSON file so scaling curves can be tracked across versions.
+
+example call: python "PortfolioBuilder benchmark.py" --days 20 250 --tickers 2 5 --output bench.json
+"""
+
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import date
+import numpy as np
+
+
+def load_portfolio_builder():
+    """
+    import PortfolioBuilder.py from the directory of this script
+    :return: the module
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PortfolioBuilder.py')
+    spec = importlib.util.spec_from_file_location('PortfolioBuilder', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_builder(pb_module, days, tickers, seed, correlation=0.3):
+    """
+    a PortfolioBuilder loaded with synthetic prices
+    :param correlation: one correlation for every pair of tickers, or a correlation matrix whose leading
+     tickers*tickers block is used
+    :return: PortfolioBuilder
+    """
+    tickers_list = [f"S{i:02d}" for i in range(tickers)]
+    if np.ndim(correlation) == 0:
+        source = pb_module.SyntheticDataSource(correlation=correlation, seed=seed)
+    else:
+        source = pb_module.SyntheticDataSource(correlation=correlation[:tickers, :tickers], seed=seed,
+                                               tickers=tickers_list)
+    pb = pb_module.PortfolioBuilder(source)
+    # enough calendar days for the requested number of business days
+    start = date(2000, 1, 3)
+    end = date.fromordinal(start.toordinal() + days * 7 // 5 + 7)
+    pb.get_daily_data(tickers_list, start, end)
+    pb.stock_data = pb.stock_data.iloc[:days]
+    return pb
+
+
+def measure(run):
+    """
+    time a run, then measure its peak python/numpy memory on a second run
+    :return: (seconds, peak bytes)
+    """
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def git_commit():
+    """
+    the current commit hash, None outside a git checkout
+    :return: str or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(days_grid, tickers_grid, quantizations, max_portfolios, seed, output, correlation=0.3):
+    """
+    run every (strategy, days, tickers, quantization) combination and write the JSON report.
+    universal portfolio runs whose simplex grid has more than max_portfolios portfolios are skipped.
+    :param correlation: a number or a correlation matrix at least as large as the largest tickers count
+    :return: the report dict
+    """
+    pb_module = load_portfolio_builder()
+    if np.ndim(correlation) and len(correlation) < max(tickers_grid):
+        raise ValueError(f"the correlation matrix has {len(correlation)} tickers, the grid needs {max(tickers_grid)}")
+    results = []
+    for days in days_grid:
+        for tickers in tickers_grid:
+            pb = make_builder(pb_module, days, tickers, seed, correlation)
+            runs = [('exponential_gradient', None, pb.find_exponential_gradient_portfolio)]
+            for q in quantizations:
+                if math.comb(q + tickers - 1, tickers - 1) <= max_portfolios:
+                    runs.append(('universal', q, lambda q=q: pb.find_universal_portfolio(q)))
+            for strategy, q, run in runs:
+                seconds, peak = measure(run)
+                results.append({'strategy': strategy, 'days': days, 'tickers': tickers,
+                                'portfolio_quantization': q, 'seconds': seconds, 'peak_bytes': peak})
+                print(f"{strategy:21} days={days:5} tickers={tickers:3} q={str(q):4} "
+                      f"{seconds:10.4f} s {peak / 2 ** 20:9.1f} MB")
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+              'seed': seed, 'correlation': np.asarray(correlation).tolist(), 'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, nargs='+', default=[20, 250, 1000, 5000])
+    parser.add_argument('--tickers', type=int, nargs='+', default=[2, 5, 10, 50])
+    parser.add_argument('--quantization', type=int, nargs='+', default=[5, 10, 20])
+    parser.add_argument('--max-portfolios', type=int, default=2_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--correlation', type=float, default=0.3, help='correlation of every pair of tickers')
+    parser.add_argument('--correlation-matrix', type=str, default=None,
+                        help='.npy file with a correlation matrix, overrides --correlation')
+    parser.add_argument('--output', type=str, default='portfolio_benchmark.json')
+    args = parser.parse_args()
+    correlation = np.load(args.correlation_matrix) if args.correlation_matrix else args.correlation
+    run_benchmarks(args.days, args.tickers, args.quantization, args.max_portfolios, args.seed, args.output,
+                   correlation)
@@ -3,17 +3,729 @@
 # If you feel these aren't sufficient, and you need other modules which require installation,
 # you're welcome to consult with the course staff.
 import math
+import os
+import time
+from multiprocessing import Pool, shared_memory
 import numpy as np
 import pandas as pd
 from datetime import date
-import itertools
 import yfinance as yf
 import pandas_datareader as pdr
-from typing import List
+from typing import List, Sequence, Union
+
+
+def simplex_grid(number_of_stocks: int, portfolio_quantization: int, dtype=np.float32) -> np.ndarray:
+    """
+    all portfolios whose weights are multiples of 1/portfolio_quantization, enumerated directly as the
+    compositions of portfolio_quantization into number_of_stocks parts (stars and bars)
+
+    :param int number_of_stocks: number of weights per portfolio
+    :param int portfolio_quantization: number of weight steps
+    :param dtype: dtype of the returned weights
+    :return: array of comb(q+n-1, n-1) portfolios, one per row
+    :rtype: np.ndarray
+    """
+    return simplex_block(np.zeros((1, 0), dtype=np.int64), np.array([portfolio_quantization]),
+                         number_of_stocks, portfolio_quantization, dtype)
+
+
+def simplex_block(prefix: np.ndarray, remaining: np.ndarray, parts: int, portfolio_quantization: int,
+                  dtype) -> np.ndarray:
+    """
+    complete every prefix row with all the compositions of its remaining steps into the given number of parts
+
+    :param np.ndarray prefix: fixed leading step counts, one row per prefix
+    :param np.ndarray remaining: the steps left for every prefix
+    :param int parts: number of weights still to fill
+    :return: the completed portfolios as weights
+    :rtype: np.ndarray
+    """
+    counts = prefix
+    for _ in range(parts - 1):
+        repeats = remaining + 1
+        rows = np.repeat(np.arange(len(counts)), repeats)
+        step = np.arange(len(rows)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        counts = np.column_stack((counts[rows], step))
+        remaining = remaining[rows] - step
+    counts = np.column_stack((counts, remaining))
+    return (counts / portfolio_quantization).astype(dtype)
+
+
+def iter_simplex_grid(number_of_stocks: int, portfolio_quantization: int, chunk_size: int = 1 << 20,
+                      dtype=np.float32):
+    """
+    the simplex grid of simplex_grid in chunks of at most chunk_size portfolios. the leading weights are fixed
+    to the shallowest depth at which every completion fits in a chunk, and consecutive prefixes are packed
+    together until the next one would overflow it, so the chunks stay close to chunk_size.
+
+    :param int number_of_stocks: number of weights per portfolio
+    :param int portfolio_quantization: number of weight steps
+    :param int chunk_size: max portfolios per chunk
+    :return: generator of portfolio arrays
+    """
+    depth = 0
+    while depth < number_of_stocks - 1 and \
+            math.comb(portfolio_quantization + number_of_stocks - depth - 1, number_of_stocks - depth - 1) > chunk_size:
+        depth += 1
+    parts = number_of_stocks - depth
+
+    def prefixes(prefix, remaining):
+        if len(prefix) == depth:
+            yield prefix, remaining
+            return
+        for step in range(remaining + 1):
+            yield from prefixes(prefix + [step], remaining - step)
+
+    batch, batch_remaining, batch_size = [], [], 0
+    for prefix, remaining in prefixes([], portfolio_quantization):
+        size = math.comb(remaining + parts - 1, parts - 1)
+        if batch and batch_size + size > chunk_size:
+            yield simplex_block(np.array(batch, dtype=np.int64).reshape(len(batch), depth),
+                                np.array(batch_remaining), parts, portfolio_quantization, dtype)
+            batch, batch_remaining, batch_size = [], [], 0
+        batch.append(prefix)
+        batch_remaining.append(remaining)
+        batch_size += size
+    yield simplex_block(np.array(batch, dtype=np.int64).reshape(len(batch), depth),
+                        np.array(batch_remaining), parts, portfolio_quantization, dtype)
+
+
+def universal_wealth(x_vec: np.ndarray, portfolios) -> np.ndarray:
+    """
+    wealth of the universal portfolio, kept incrementally: every candidate portfolio has a running wealth
+    that is updated with one matrix-vector product per day, and the next day's portfolio is the
+    wealth weighted average of the candidates. the candidates may come in chunks, whose wealth weighted sums
+    are accumulated per day, so the whole grid never has to be in memory.
+    the wealth is kept as a log and the sums are scaled by the running max log wealth of each day (log-sum-exp),
+    so products over many years of daily returns neither overflow nor underflow.
+
+    :param np.ndarray x_vec: price relatives, one row per day (days-1 x stocks)
+    :param portfolios: candidate portfolios, one per row (portfolios x stocks), or an iterable of such chunks
+    :return: the wealth per day, starting from 1
+    :rtype: np.ndarray
+    """
+    if isinstance(portfolios, np.ndarray):
+        portfolios = [portfolios]
+    days, number_of_stocks = x_vec.shape
+    numerator = np.zeros((days, number_of_stocks))
+    denominator = np.zeros(days)
+    # the log wealth that numerator and denominator of each day are scaled by
+    offset = np.full(days, -np.inf)
+    for chunk in portfolios:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        log_wealth = np.zeros(len(chunk))
+        for day in range(days):
+            log_wealth += np.log(chunk @ x_vec[day])
+            top = np.max(log_wealth)
+            if top > offset[day]:
+                scale = np.exp(offset[day] - top)
+                numerator[day] *= scale
+                denominator[day] *= scale
+                offset[day] = top
+            wealth = np.exp(log_wealth - offset[day])
+            numerator[day] += wealth @ chunk
+            denominator[day] += np.sum(wealth)
+
+    s_vec = np.zeros(days + 1)
+    s_vec[0] = 1
+    b_vec = np.full(number_of_stocks, 1 / number_of_stocks)
+    for day in range(1, days + 1):
+        s_vec[day] = s_vec[day - 1] * np.dot(b_vec, x_vec[day - 1])
+        b_vec = numerator[day - 1] / denominator[day - 1]
+    return s_vec
+
+
+def dirichlet_batches(number_of_stocks: int, samples: int, batch_size: int, rng: np.random.Generator):
+    """
+    uniform random portfolios (a flat Dirichlet distribution over the simplex) in batches
+
+    :param int number_of_stocks: number of weights per portfolio
+    :param int samples: total number of portfolios
+    :param int batch_size: max portfolios per batch
+    :param np.random.Generator rng: random generator
+    :return: generator of portfolio arrays
+    """
+    for start in range(0, samples, batch_size):
+        yield rng.dirichlet(np.ones(number_of_stocks), size=min(batch_size, samples - start))
+
+
+def sampled_universal_wealth(x_vec: np.ndarray, samples: int = 10000, seed: int = None, batch_size: int = 4096,
+                             mcmc_steps: int = 0, step_size: float = 0.05) -> np.ndarray:
+    """
+    wealth of the universal portfolio estimated from random portfolios instead of the full simplex grid.
+    without mcmc_steps the samples are processed in batches by universal_wealth. with mcmc_steps the samples
+    are particles that are resampled by wealth whenever the effective sample size drops below half, then moved
+    by Metropolis steps (a symmetric random walk on the simplex) that target the wealth weighted distribution,
+    which keeps the estimate accurate once the wealth concentrates on few portfolios. the particles keep a running
+    log wealth, so the daily update is linear in tickers and days, but every resampling prices the proposals of
+    each Metropolis step over the whole history so far: O(day * samples * mcmc_steps) per resampling.
+
+    :param np.ndarray x_vec: price relatives, one row per day (days-1 x stocks)
+    :param int samples: number of random portfolios
+    :param int seed: random seed
+    :param int batch_size: max portfolios per batch without mcmc
+    :param int mcmc_steps: Metropolis steps after every resampling, 0 for plain Monte Carlo
+    :param float step_size: scale of the random walk proposals
+    :return: the wealth per day, starting from 1
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    days, number_of_stocks = x_vec.shape
+    if not mcmc_steps:
+        return universal_wealth(x_vec, dirichlet_batches(number_of_stocks, samples, batch_size, rng))
+
+    particles = rng.dirichlet(np.ones(number_of_stocks), size=samples)
+    log_weights = np.zeros(samples)
+    log_wealth = np.zeros(samples)
+    s_vec = np.zeros(days + 1)
+    s_vec[0] = 1
+    b_vec = np.full(number_of_stocks, 1 / number_of_stocks)
+    for day in range(1, days + 1):
+        s_vec[day] = s_vec[day - 1] * np.dot(b_vec, x_vec[day - 1])
+        growth = np.log(particles @ x_vec[day - 1])
+        log_weights += growth
+        log_wealth += growth
+        weights = np.exp(log_weights - np.max(log_weights))
+        b_vec = weights @ particles / np.sum(weights)
+        # effective sample size (sum w)^2 / sum w^2 still above half the particles
+        if day == days or np.sum(weights) ** 2 >= 0.5 * samples * np.sum(weights ** 2):
+            continue
+
+        # systematic resampling by wealth, then moves that keep the wealth weighted distribution
+        positions = (rng.random() + np.arange(samples)) / samples
+        chosen = np.minimum(np.searchsorted(np.cumsum(weights) / np.sum(weights), positions), samples - 1)
+        particles = particles[chosen]
+        log_wealth = log_wealth[chosen]
+        log_weights = np.zeros(samples)
+        history = x_vec[:day]
+        for _ in range(mcmc_steps):
+            noise = rng.standard_normal(particles.shape)
+            proposal = particles + step_size * (noise - noise.mean(axis=1, keepdims=True))
+            inside = np.all(proposal > 0, axis=1)
+            proposal_log_wealth = np.full(samples, -np.inf)
+            proposal_log_wealth[inside] = np.sum(np.log(proposal[inside] @ history.T), axis=1)
+            accept = np.log(rng.random(samples)) < proposal_log_wealth - log_wealth
+            particles[accept] = proposal[accept]
+            log_wealth[accept] = proposal_log_wealth[accept]
+    return s_vec
+
+
+def exponential_gradient_wealth(x_vec: np.ndarray, learn_rates) -> np.ndarray:
+    """
+    wealth of the exponential gradient portfolio for several learning rates at once. every day updates the
+    portfolios of all the rates with one vector step: b = b * exp(rate * x / (b . x)), normalized to 1.
+
+    :param np.ndarray x_vec: price relatives, one row per day (days-1 x stocks)
+    :param learn_rates: sequence of learning rates
+    :return: (rates x days) array of the wealth per day, starting from 1
+    :rtype: np.ndarray
+    """
+    learn_rates = np.asarray(learn_rates, dtype=np.float64).reshape(-1, 1)
+    days, number_of_stocks = x_vec.shape
+    s_vec = np.ones((len(learn_rates), days + 1))
+    b_vec = np.full((len(learn_rates), number_of_stocks), 1 / number_of_stocks)
+    for day in range(days):
+        growth = b_vec @ x_vec[day]
+        s_vec[:, day + 1] = s_vec[:, day] * growth
+        exponent = learn_rates * x_vec[day] / growth[:, None]
+        # shifting the exponents by their max does not change the normalized portfolio
+        b_vec = b_vec * np.exp(exponent - np.max(exponent, axis=1, keepdims=True))
+        b_vec /= np.sum(b_vec, axis=1, keepdims=True)
+    return s_vec
+
+
+def universal_strategy(x_vec: np.ndarray, portfolio_quantization: int = 20) -> np.ndarray:
+    """
+    :return: wealth per day of the universal portfolio over the simplex grid
+    """
+    return universal_wealth(x_vec, simplex_grid(x_vec.shape[1], portfolio_quantization, np.float64))
+
+
+def exponential_gradient_strategy(x_vec: np.ndarray, learn_rate: float = 0.5) -> np.ndarray:
+    """
+    :return: wealth per day of the exponential gradient portfolio
+    """
+    return exponential_gradient_wealth(x_vec, [learn_rate])[0]
+
+
+# strategies of the backtest engine by name, each maps price relatives and keyword params to the wealth per day
+STRATEGIES = {'universal': universal_strategy,
+              'sampled_universal': sampled_universal_wealth,
+              'exponential_gradient': exponential_gradient_strategy}
+
+
+def max_drawdown(s_vec: np.ndarray) -> float:
+    """
+    :return: the largest relative drop of the wealth from a previous peak
+    """
+    s_vec = np.asarray(s_vec)
+    return float(np.max(1 - s_vec / np.maximum.accumulate(s_vec)))
+
+
+# shared price matrix of a backtest worker process, set by init_backtest_worker
+backtest_worker = {}
+
+
+def init_backtest_worker(name: str, shape: tuple):
+    """
+    attach a worker process to the shared price matrix
+    """
+    buffer = shared_memory.SharedMemory(name=name)
+    backtest_worker['buffer'] = buffer
+    backtest_worker['prices'] = np.ndarray(shape, dtype=np.float64, buffer=buffer.buf)
+
+
+def run_backtest_job(job: dict) -> dict:
+    """
+    run one strategy on a window of days and a subset of ticker columns of the shared price matrix
+
+    :param dict job: 'strategy', 'start' and 'end' (day rows, end excluded), 'columns' and 'params'
+    :return: the job with its final wealth, max drawdown and runtime
+    """
+    started = time.perf_counter()
+    prices = backtest_worker['prices'][job['start']:job['end'], job['columns']]
+    x_vec = prices[1:] / prices[:-1]
+    s_vec = STRATEGIES[job['strategy']](x_vec, **job['params'])
+    return dict(job, final_wealth=float(s_vec[-1]), max_drawdown=max_drawdown(s_vec),
+                runtime=time.perf_counter() - started)
+
+
+class BacktestEngine:
+    """
+    runs (strategy, window, ticker subset, params) jobs over one price matrix on a process pool.
+    the matrix is copied once into shared memory, the workers read it without pickling.
+    """
+
+    def __init__(self, prices: pd.DataFrame, workers: int = None):
+        self.dates = prices.index
+        self.tickers = list(prices.columns)
+        values = np.ascontiguousarray(prices.values, dtype=np.float64)
+        self.buffer = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=self.buffer.buf)[:] = values
+        self.pool = Pool(workers or os.cpu_count() or 1, init_backtest_worker, (self.buffer.name, values.shape))
+
+    def rolling_jobs(self, strategies: List[tuple], window: int, step: int,
+                     ticker_subsets: List[List[str]] = None) -> List[dict]:
+        """
+        every strategy on every rolling window and ticker subset
+
+        :param strategies: (strategy name, params dict) pairs
+        :param int window: days per window
+        :param int step: days between window starts
+        :param ticker_subsets: optional, lists of tickers, defaults to all the tickers
+        :return: list of jobs for run
+        """
+        ticker_subsets = ticker_subsets or [self.tickers]
+        jobs = []
+        for start in range(0, len(self.dates) - window + 1, step):
+            for subset in ticker_subsets:
+                columns = [self.tickers.index(ticker) for ticker in subset]
+                for name, params in strategies:
+                    jobs.append({'strategy': name, 'start': start, 'end': start + window, 'columns': columns,
+                                 'params': dict(params)})
+        return jobs
+
+    def run(self, jobs: List[dict]) -> pd.DataFrame:
+        """
+        run the jobs on the pool
+
+        :return: one row per job with its strategy, dates, tickers, params, final wealth, max drawdown and runtime
+        :rtype: pd.DataFrame
+        """
+        results = pd.DataFrame(self.pool.map(run_backtest_job, jobs, chunksize=max(1, len(jobs) // 64)))
+        if len(results):
+            results.insert(1, 'start_date', self.dates[results['start']])
+            results.insert(2, 'end_date', self.dates[results['end'] - 1])
+            results['tickers'] = [','.join(self.tickers[c] for c in columns) for columns in results['columns']]
+        return results
+
+    def close(self):
+        """
+        stop the pool and free the shared price matrix
+        """
+        self.pool.close()
+        self.pool.join()
+        self.buffer.close()
+        self.buffer.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OnlineUniversalPortfolio:
+    """
+    universal portfolio that is fed one price row per day. the state is the log wealth of every grid portfolio,
+    the current portfolio, the wealth and the last prices, so an update costs O(portfolios) and a checkpoint
+    never needs the price history (the grid is rebuilt from its size on load).
+    """
+
+    def __init__(self, number_of_stocks: int, portfolio_quantization: int = 20):
+        self.number_of_stocks = number_of_stocks
+        self.portfolio_quantization = portfolio_quantization
+        self.portfolios = simplex_grid(number_of_stocks, portfolio_quantization, np.float64)
+        self.log_wealth = np.zeros(len(self.portfolios))
+        self.b_vec = np.full(number_of_stocks, 1 / number_of_stocks)
+        self.wealth = 1.0
+        self.last_prices = None
+
+    def update(self, price_row) -> tuple:
+        """
+        add the prices of a new day
+
+        :param price_row: the price of every stock
+        :return: (portfolio for the next day, wealth so far)
+        """
+        price_row = np.asarray(price_row, dtype=np.float64)
+        if self.last_prices is not None:
+            x = price_row / self.last_prices
+            self.wealth *= float(np.dot(self.b_vec, x))
+            self.log_wealth += np.log(self.portfolios @ x)
+            weights = np.exp(self.log_wealth - np.max(self.log_wealth))
+            self.b_vec = weights @ self.portfolios / np.sum(weights)
+        self.last_prices = price_row
+        return self.b_vec.copy(), self.wealth
+
+    def save(self, path: str):
+        """
+        checkpoint the state to a .npz file
+        """
+        np.savez(path, number_of_stocks=self.number_of_stocks, portfolio_quantization=self.portfolio_quantization,
+                 log_wealth=self.log_wealth, b_vec=self.b_vec, wealth=self.wealth,
+                 last_prices=self.last_prices if self.last_prices is not None else np.zeros(0))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        restore a checkpoint written by save
+        """
+        with np.load(path) as state:
+            online = cls(int(state['number_of_stocks']), int(state['portfolio_quantization']))
+            online.log_wealth = state['log_wealth']
+            online.b_vec = state['b_vec']
+            online.wealth = float(state['wealth'])
+            online.last_prices = state['last_prices'] if len(state['last_prices']) else None
+        return online
+
+
+class OnlineExponentialGradientPortfolio:
+    """
+    exponential gradient portfolio that is fed one price row per day, O(stocks) per update
+    """
+
+    def __init__(self, number_of_stocks: int, learn_rate: float = 0.5):
+        self.learn_rate = learn_rate
+        self.b_vec = np.full(number_of_stocks, 1 / number_of_stocks)
+        self.wealth = 1.0
+        self.last_prices = None
+
+    def update(self, price_row) -> tuple:
+        """
+        add the prices of a new day
+
+        :param price_row: the price of every stock
+        :return: (portfolio for the next day, wealth so far)
+        """
+        price_row = np.asarray(price_row, dtype=np.float64)
+        if self.last_prices is not None:
+            x = price_row / self.last_prices
+            growth = float(np.dot(self.b_vec, x))
+            self.wealth *= growth
+            exponent = self.learn_rate * x / growth
+            self.b_vec = self.b_vec * np.exp(exponent - np.max(exponent))
+            self.b_vec /= np.sum(self.b_vec)
+        self.last_prices = price_row
+        return self.b_vec.copy(), self.wealth
+
+    def save(self, path: str):
+        """
+        checkpoint the state to a .npz file
+        """
+        np.savez(path, learn_rate=self.learn_rate, b_vec=self.b_vec, wealth=self.wealth,
+                 last_prices=self.last_prices if self.last_prices is not None else np.zeros(0))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        restore a checkpoint written by save
+        """
+        with np.load(path) as state:
+            online = cls(len(state['b_vec']), float(state['learn_rate']))
+            online.b_vec = state['b_vec']
+            online.wealth = float(state['wealth'])
+            online.last_prices = state['last_prices'] if len(state['last_prices']) else None
+        return online
+
+
+class YahooDataSource:
+    """
+    adjusted close prices downloaded from yahoo finance
+    """
+
+    def fetch(self, tickers_list: List[str], start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        :return: daily adjusted close prices, one column per ticker
+        :rtype: pd.DataFrame
+        """
+        return pdr.DataReader(tickers_list, 'yahoo', start_date, end_date)['Adj Close']
+
+
+class CsvDataSource:
+    """
+    adjusted close prices read from a local csv file with a date column followed by one column per ticker
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, tickers_list: List[str], start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        :return: daily adjusted close prices, one column per ticker
+        :rtype: pd.DataFrame
+        """
+        prices = pd.read_csv(self.path, index_col=0, parse_dates=True)
+        return prices.loc[pd.Timestamp(start_date):pd.Timestamp(end_date), list(tickers_list)]
+
+
+def synthetic_prices(tickers_list: List[str], dates: pd.DatetimeIndex, drift: float = 0.05, volatility: float = 0.2,
+                     correlation=0.3, seed: int = None, start_price: float = 100.0) -> pd.DataFrame:
+    """
+    correlated geometric brownian motion prices, one trading day per date
+
+    :param List[str] tickers_list: column names
+    :param pd.DatetimeIndex dates: the dates of the prices
+    :param float drift: yearly drift of every stock
+    :param float volatility: yearly volatility of every stock
+    :param correlation: correlation matrix of the daily returns, or one correlation for every pair of stocks
+    :param int seed: random seed
+    :param float start_price: price of every stock on the first date
+    :return: daily prices, one column per ticker
+    :rtype: pd.DataFrame
+    """
+    number_of_stocks = len(tickers_list)
+    if np.ndim(correlation) == 0:
+        correlation = np.full((number_of_stocks, number_of_stocks), float(correlation))
+        np.fill_diagonal(correlation, 1.0)
+    cholesky = np.linalg.cholesky(np.asarray(correlation, dtype=np.float64))
+    dt = 1 / 252
+    rng = np.random.default_rng(seed)
+    shocks = rng.standard_normal((max(len(dates) - 1, 0), number_of_stocks)) @ cholesky.T
+    log_returns = (drift - volatility ** 2 / 2) * dt + volatility * np.sqrt(dt) * shocks
+    log_prices = np.vstack((np.zeros((1, number_of_stocks)), np.cumsum(log_returns, axis=0)))[:len(dates)]
+    return pd.DataFrame(start_price * np.exp(log_prices), index=dates, columns=list(tickers_list))
+
+
+class SyntheticDataSource:
+    """
+    offline stand-in for yahoo finance. every ticker has one fixed geometric brownian motion path over the business
+    days of a fixed calendar and fetch only slices it, so a price depends on nothing but (ticker, date) and
+    separately fetched ranges join into one continuous series.
+    without tickers any ticker name can be fetched: its path is seeded by the seed and the name, and the daily
+    returns share one market factor, which gives every pair of tickers the same (scalar) correlation.
+    with a fixed tickers universe the paths of all of them are drawn at once by synthetic_prices, so correlation
+    may also be a full correlation matrix in the order of tickers.
+    """
+
+    def __init__(self, drift: float = 0.05, volatility: float = 0.2, correlation=0.3, seed: int = 0,
+                 calendar_start: date = date(1990, 1, 1), calendar_end: date = date(2050, 12, 31),
+                 start_price: float = 100.0, tickers: List[str] = None):
+        if tickers is None and not (np.ndim(correlation) == 0 and 0 <= correlation <= 1):
+            raise ValueError("without a tickers universe correlation must be one number between 0 and 1")
+        self.drift = drift
+        self.volatility = volatility
+        self.correlation = correlation
+        self.seed = seed
+        self.start_price = start_price
+        self.calendar_start, self.calendar_end = pd.Timestamp(calendar_start), pd.Timestamp(calendar_end)
+        self.calendar = pd.bdate_range(calendar_start, calendar_end)
+        self.tickers = list(tickers) if tickers is not None else None
+        self.paths = {}
+        if self.tickers is not None:
+            prices = synthetic_prices(self.tickers, self.calendar, drift, volatility, correlation, seed, start_price)
+            self.paths = {ticker: prices[ticker].values for ticker in self.tickers}
+        else:
+            self.market = np.random.default_rng([seed, 0]).standard_normal(len(self.calendar) - 1)
+
+    def path(self, ticker: str) -> np.ndarray:
+        """
+        :return: the prices of a ticker on every calendar day
+        """
+        if ticker not in self.paths:
+            if self.tickers is not None:
+                raise ValueError(f"{ticker!r} is not in the synthetic tickers universe")
+            rng = np.random.default_rng([self.seed, 1] + list(ticker.encode()))
+            shocks = np.sqrt(self.correlation) * self.market + \
+                np.sqrt(1 - self.correlation) * rng.standard_normal(len(self.market))
+            dt = 1 / 252
+            log_returns = (self.drift - self.volatility ** 2 / 2) * dt + self.volatility * np.sqrt(dt) * shocks
+            self.paths[ticker] = self.start_price * np.exp(np.concatenate(([0.0], np.cumsum(log_returns))))
+        return self.paths[ticker]
+
+    def fetch(self, tickers_list: List[str], start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        :return: daily synthetic prices, one column per ticker
+        :rtype: pd.DataFrame
+        """
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        if start < self.calendar_start or end > self.calendar_end:
+            raise ValueError(f"dates {start_date} - {end_date} are outside the synthetic calendar "
+                             f"{self.calendar_start.date()} - {self.calendar_end.date()}")
+        first, last = self.calendar.searchsorted(start), self.calendar.searchsorted(end, side='right')
+        return pd.DataFrame({ticker: self.path(ticker)[first:last] for ticker in tickers_list},
+                            index=self.calendar[first:last], columns=list(tickers_list))
+
+
+class PriceCache:
+    """
+    local on-disk cache of adjusted close prices. every ticker has a directory with memory-mappable .npy files:
+    dates.npy (datetime64[D]), close.npy (float64) and coverage.npy (the first and last date already fetched,
+    which may be holidays with no price). only the date ranges outside the coverage are fetched from the source.
+    """
+
+    def __init__(self, cache_dir: str, source=None):
+        self.cache_dir = cache_dir
+        self.source = source if source is not None else YahooDataSource()
+
+    def ticker_dir(self, ticker: str) -> str:
+        """
+        :return: the cache directory of a ticker
+        """
+        return os.path.join(self.cache_dir, ticker)
+
+    def read(self, ticker: str):
+        """
+        :return: memory mapped (dates, close, coverage) of a ticker, or None when it is not cached
+        """
+        path = self.ticker_dir(ticker)
+        if not os.path.isfile(os.path.join(path, 'coverage.npy')):
+            return None
+        return tuple(np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                     for name in ('dates', 'close', 'coverage'))
+
+    def write(self, ticker: str, dates: np.ndarray, close: np.ndarray, coverage: np.ndarray):
+        """
+        replace the cached series of a ticker
+        """
+        path = self.ticker_dir(ticker)
+        os.makedirs(path, exist_ok=True)
+        # coverage is written last, so an interrupted write is refetched
+        for name, values in (('dates', dates), ('close', close), ('coverage', coverage)):
+            tmp = os.path.join(path, name + '.tmp.npy')
+            np.save(tmp, values)
+            os.replace(tmp, os.path.join(path, name + '.npy'))
+
+    def missing_ranges(self, ticker: str, start: np.datetime64, end: np.datetime64) -> List[tuple]:
+        """
+        the date ranges to fetch so the cache of a ticker covers the request. a request wholly before or after
+        the cached range also fetches the gap up to it, so the coverage stays one interval without holes.
+
+        :return: list of (start, end) date ranges
+        """
+        cached = self.read(ticker)
+        if cached is None:
+            return [(start, end)]
+        first, last = cached[2]
+        one_day = np.timedelta64(1, 'D')
+        ranges = []
+        if start < first:
+            ranges.append((start, first - one_day))
+        if end > last:
+            ranges.append((last + one_day, end))
+        return ranges
+
+    def update(self, tickers_list: List[str], start: np.datetime64, end: np.datetime64):
+        """
+        fetch the missing date ranges of the tickers, one source call per distinct range
+        """
+        requests = {}
+        for ticker in tickers_list:
+            for date_range in self.missing_ranges(ticker, start, end):
+                requests.setdefault(date_range, []).append(ticker)
+
+        for (range_start, range_end), tickers in requests.items():
+            fetched = self.source.fetch(tickers, range_start.astype(date), range_end.astype(date))
+            if isinstance(fetched, pd.Series):
+                fetched = fetched.to_frame(tickers[0])
+            for ticker in tickers:
+                prices = fetched[ticker].dropna()
+                new_dates = prices.index.values.astype('datetime64[D]')
+                cached = self.read(ticker)
+                if cached is None:
+                    dates, close, coverage = new_dates, prices.values.astype(np.float64), [range_start, range_end]
+                else:
+                    dates = np.concatenate((cached[0], new_dates))
+                    close = np.concatenate((cached[1], prices.values.astype(np.float64)))
+                    coverage = [min(cached[2][0], range_start), max(cached[2][1], range_end)]
+                    dates, unique = np.unique(dates, return_index=True)
+                    close = close[unique]
+                self.write(ticker, dates, close, np.array(coverage, dtype='datetime64[D]'))
+
+    def load(self, tickers_list: List[str], start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        adjusted close prices of the tickers between the dates, fetching only what is not cached yet.
+        only the requested slice of every memory mapped series is copied into memory.
+
+        :return: daily adjusted close prices, one column per ticker
+        :rtype: pd.DataFrame
+        """
+        start, end = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+        self.update(tickers_list, start, end)
+        columns = {}
+        for ticker in tickers_list:
+            dates, close, _ = self.read(ticker)
+            first, last = np.searchsorted(dates, start), np.searchsorted(dates, end, side='right')
+            columns[ticker] = pd.Series(np.array(close[first:last]), index=pd.DatetimeIndex(dates[first:last]))
+        return pd.DataFrame(columns)
 
 
 class PortfolioBuilder:
 
+    def __init__(self, data_source=None, cache_dir: str = None):
+        """
+        :param data_source: optional, object with a fetch(tickers_list, start_date, end_date) method that returns
+         adjusted close prices, defaults to yahoo finance
+        :param str cache_dir: optional, directory of a local price cache
+        """
+        self.data_source = data_source if data_source is not None else YahooDataSource()
+        self.price_cache = PriceCache(cache_dir, self.data_source) if cache_dir is not None else None
+
+    @property
+    def stock_data(self) -> pd.DataFrame:
+        """
+        daily adjusted close prices, one column per ticker
+        """
+        return self._stock_data
+
+    @stock_data.setter
+    def stock_data(self, data: pd.DataFrame):
+        # the price relatives (x_vec) of all the strategies are computed once, when the data is set
+        self._stock_data = data
+        values = np.asarray(data.values, dtype=np.float64)
+        self.price_relatives = np.ascontiguousarray(values[1:] / values[:-1])
+        self.price_relative_dates = data.index[1:]
+
+    def append_daily_data(self, new_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        append later days to the loaded data, computing only the new price relatives
+
+        :param pd.DataFrame new_data: adjusted close prices with a column for every ticker of the loaded data
+        :return: all the daily adjusted close prices
+        :rtype: pd.DataFrame
+        """
+        new_data = new_data[list(self.tickers_list)]
+        if new_data.isnull().values.any():
+            raise ValueError
+        values = np.asarray(new_data.values, dtype=np.float64)
+        previous = np.asarray(self._stock_data.values[-1:], dtype=np.float64)
+        joined = np.concatenate((previous, values))
+        self.price_relatives = np.ascontiguousarray(np.concatenate((self.price_relatives,
+                                                                    joined[1:] / joined[:-1])))
+        self._stock_data = pd.concat((self._stock_data, new_data))
+        self.price_relative_dates = self._stock_data.index[1:]
+        return self._stock_data
+
     def get_daily_data(self, tickers_list: List[str],start_date: date,end_date: date = date.today()) -> pd.DataFrame:
         """
         get stock tickers adj_close price for specified dates.
@@ -27,126 +739,72 @@ class PortfolioBuilder:
         example call: get_daily_data(['GOOG', 'INTC', 'MSFT', ''AAPL'], date(2018, 12, 31), date(2019, 12, 31))
         """
         try:
-            data = pdr.DataReader(tickers_list,'yahoo',start_date,end_date)
-            df_close=data['Adj Close']
-            self.stock_data = data
+            if self.price_cache is not None:
+                df_close = self.price_cache.load(tickers_list, start_date, end_date)
+            else:
+                df_close = self.data_source.fetch(tickers_list, start_date, end_date)
+            df_close = df_close[list(tickers_list)]
+            self.stock_data = df_close
             self.tickers_list = tickers_list
             if df_close.isnull().values.any():
                 raise ValueError
-            return data['Adj Close']
+            return df_close
         except Exception:
             raise  ValueError
 
-    def find_universal_portfolio(self, portfolio_quantization: int = 20) -> List[float]:
+    def find_universal_portfolio(self, portfolio_quantization: int = 20, chunk_size: int = None) -> List[float]:
         """
         calculates the universal portfolio for the previously requested stocks
 
         :param int portfolio_quantization: size of discrete steps of between computed portfolios. each step has size 1/portfolio_quantization
+        :param int chunk_size: optional, process the portfolio grid in chunks of at most this many portfolios
         :return: returns a list of floats, representing the growth trading  per day
         """
-        stock_data = self.stock_data['Adj Close']
         number_of_stocks = len(self.tickers_list)
         p_f_q=portfolio_quantization
+        x_vec = self.price_relatives
+
+        # all portfolios with weights in steps of 1/p_f_q
+        if chunk_size is None:
+            b_w = simplex_grid(number_of_stocks, p_f_q, np.float64)
+        else:
+            b_w = iter_simplex_grid(number_of_stocks, p_f_q, chunk_size, np.float64)
 
-        # x_vec init
-        x_vec = []
-        for i in range(len(stock_data)-1):
-            x_vec.append(list(stock_data.iloc[i+1] / stock_data.iloc[i]))
-        x_vec=np.array(x_vec)
-
-        a=(1 / p_f_q)
-        b = np.arange(0.0, 1.0,a)
-        b = np.append(1.0, b)
-        product = list(itertools.product(b, repeat=number_of_stocks))
-        all_perm = [np.round(i, 10) for i in product]
-        # b_vec init
-        b_vec_inittial=np.zeros(number_of_stocks)
-        b_vec_inittial+=(1 / number_of_stocks)
-        # all permuation sum to 1
-        b_w = [i for i in all_perm if 0.999 <= np.sum(i) <= 1.001]
-        b_vec=np.zeros((len(stock_data), number_of_stocks))
-        b_vec[0]=b_vec_inittial
-
-        s_vec=np.zeros(len(stock_data))
-        # s_vec init with s_0=1
-        s_vec[0]=1
-        s_vec[1]=np.dot(b_vec_inittial, x_vec[0])
-        result=[np.dot(a, x_vec[0]) for a in b_w]
-        sum_denominator=np.sum(result)
-        sum2=[a * j for a,j in zip(b_w, result)]
-        sum_numerator=np.sum(sum2,axis=0)
-        b_vec[1]= sum_numerator / sum_denominator
-
-        # This for loop calculate the wealth S_vector, x vector * b vector calculation from day 2
-        for day in range(2, len(stock_data)):
-                s_vec[day]=np.dot(s_vec[day - 1], np.dot(b_vec[day - 1], x_vec[day - 1]))
-                s_lis=[]
-                result=[]
-                for i in b_w:
-                    s_list=[]
-                    for j in range(0,day):
-                        s_list.append(np.dot(x_vec[j], i))
-                    s_lis.append(np.prod(s_list))
-                    u_sum= i * np.prod(s_list)
-                    result.append(u_sum)
-
-                sum_denominator=np.sum(s_lis)
-                sum_numerator=np.sum(result, axis=0)
-                b_vec[day]= sum_numerator / sum_denominator
+        s_vec = universal_wealth(x_vec, b_w)
         return s_vec
 
 
 
 
-    def find_exponential_gradient_portfolio(self, learn_rate: float = 0.5) -> List[float]:
+    def find_sampled_universal_portfolio(self, samples: int = 10000, seed: int = None, batch_size: int = 4096,
+                                         mcmc_steps: int = 0, step_size: float = 0.05) -> List[float]:
         """
-        calculates the exponential gradient portfolio for the previously requested stocks
-
-        :param float learn_rate: the learning rate of the algorithm, defaults to 0.5
+        calculates the universal portfolio for the previously requested stocks from random portfolios,
+        for universes too large for the simplex grid of find_universal_portfolio
+
+        :param int samples: number of portfolios drawn from a flat Dirichlet distribution
+        :param int seed: optional, random seed
+        :param int batch_size: max portfolios processed together
+        :param int mcmc_steps: optional, Metropolis refinement steps after every resampling
+        :param float step_size: scale of the Metropolis random walk
         :return: returns a list of floats, representing the growth trading  per day
         """
+        return sampled_universal_wealth(self.price_relatives, samples, seed, batch_size, mcmc_steps, step_size)
 
-        stock_data = self.stock_data['Adj Close']
-        number_of_stocks = len(self.tickers_list)
-
-        # s_vec init
-        s_vec = []
-        s_0=1.0
-        s_vec.append(s_0)
-
-        # x_vec init
-        x_vec = []
-        for i in range(len(stock_data)-1):
-            x_vec.append(list(stock_data.iloc[i+1] / stock_data.iloc[i]))
-
-        # b_vec init
-        b_vec = []
-        b_vec.append([ 1 / number_of_stocks for i in range(number_of_stocks)])
-
-        for i in range(len(stock_data)-1):
-
-            result = []
-
-            for j in range(number_of_stocks):
-                numerator = learn_rate * x_vec[i][j]
-                denominator = sum([a*b for a,b in zip(x_vec[i],b_vec[i])])
-                a_b_exp =  b_vec[i][j] * math.exp(numerator/denominator)
-                result.append(a_b_exp)
-
-            item = []
-            for k in range(len(result)):
-                item.append(result[k] / sum(result))
-
-            b_vec.append(item)
-
-        # s_vec
-        for i in range(len(stock_data)-1):
-            # x vector * b vector calculation
-            b_multi_x = list(map(lambda x,z: x*z ,x_vec[i],b_vec[i]))
-            s_vec.append(sum(list(map( lambda x: s_vec[i]*x ,b_multi_x))))
+    def find_exponential_gradient_portfolio(self, learn_rate: Union[float, Sequence[float]] = 0.5):
+        """
+        calculates the exponential gradient portfolio for the previously requested stocks
 
+        :param learn_rate: the learning rate of the algorithm, defaults to 0.5. a sequence of learning rates
+         runs all of them at once
+        :return: returns a list of floats, representing the growth trading  per day, or a (rates x days) array
+         with a row per learning rate when learn_rate is a sequence
+        """
+        x_vec = self.price_relatives
 
-        return s_vec
+        if np.ndim(learn_rate) == 0:
+            return list(exponential_gradient_wealth(x_vec, [learn_rate])[0])
+        return exponential_gradient_wealth(x_vec, learn_rate)
 
 
 
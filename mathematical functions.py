@@ -1,3 +1,8 @@
+import inspect
+import math
+import weakref
+import numpy as np
+
 class Variable:
     def get_name(self):
         pass
@@ -19,19 +24,149 @@ class Assignments:
     def __iadd__(self, ass: Assignment):
         pass
 
-class Expression:
+class BufferPool:
+    """
+    scratch arrays of one chunk length that batch evaluation reuses for its intermediate results
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.free = []
+
+    def get(self) -> np.ndarray:
+        return self.free.pop() if self.free else np.empty(self.size)
+
+    def release(self, buffer: np.ndarray):
+        self.free.append(buffer)
+
+def batch_ufunc(ufunc, a: tuple, b: tuple, pool: BufferPool) -> tuple:
+    """
+    apply a numpy ufunc to two batch results, writing into a scratch buffer of one of them when possible.
+    a batch result is (value, owned) where value is an array or a scalar and owned tells if value is a
+    scratch buffer that may be overwritten.
+    """
+    (va, oa), (vb, ob) = a, b
+    if np.ndim(va) == 0 and np.ndim(vb) == 0:
+        return ufunc(va, vb), False
+    out = va if oa else vb if ob else pool.get()
+    ufunc(va, vb, out=out)
+    if oa and ob:
+        pool.release(vb)
+    return out, True
+
+# every live expression node by its structural key, see Interning
+INTERNED = weakref.WeakValueDictionary()
+
+class Interning(type):
+    """
+    hash-consing: calling an expression class returns the live node with the same structural key if there is
+    one, without running __init__ on it again, so structurally equal expressions are built once and shared
+    """
+    def __call__(cls, *args, **kwargs):
+        # keyword and default arguments are bound to positions, so Constant(value=2.0) is Constant(2.0)
+        bound = inspect.signature(cls.__init__).bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        args = tuple(bound.arguments.values())[1:]
+        key = cls.intern_key(*args)
+        node = INTERNED.get(key)
+        if node is None:
+            node = super().__call__(*args)
+            node.args = args
+            node.key = key
+            node.hash_value = hash(key)
+            node.derivatives = {}
+            node.order = None
+            node.parents = None
+            node.variables = None
+            node.evaluator = None
+            INTERNED[key] = node
+        return node
+
+class Expression(metaclass=Interning):
     def evaluate(self, assgms: Assignments) -> float:
+        """
+        the value of the expression. a tree runs its cached compile(), a DAG with shared subexpressions
+        computes every distinct node once into a values dict
+        """
+        if not self.children():
+            return self.compute_value(assgms, None)
+        if self.evaluator is None:
+            self.evaluator = self.compile() if not self.shared_nodes() else False
+        if self.evaluator:
+            return self.evaluator(*[assgms[name] for name in self.evaluator.variables])
+        values = {}
+        for node in self.dag()[0]:
+            values[node] = node.compute_value(assgms, values)
+        return values[self]
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
         pass
 
     def derivative(self, v: Variable):
+        """
+        the derivative by a variable, memoized per (node, variable) so repeated differentiation reuses
+        the derivatives of shared subexpressions
+        """
+        name = v.get_name()
+        if name not in self.derivatives:
+            self.derivatives[name] = self.compute_derivative(v)
+        return self.derivatives[name]
+
+    def compute_derivative(self, v: Variable):
         pass
 
     def __repr__(self) -> str:
         pass
 
-    def __eq__(self, other):
+    def __reduce__(self):
+        # rebuilt through the constructor, so copies and unpickled nodes are interned as well
+        return type(self), self.args
+
+    @classmethod
+    def intern_key(cls, *args) -> tuple:
+        pass
+
+    def children(self) -> tuple:
         pass
 
+    def __hash__(self):
+        return self.hash_value
+
+    def __eq__(self, other):
+        return self is other or (type(self) == type(other) and self.key == other.key)
+
+    def postorder(self) -> tuple:
+        """
+        the distinct nodes of the expression DAG, children before parents, and the number of parents of each
+        """
+        parents = {}
+        order = []
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                order.append(node)
+                continue
+            parents[node] = parents.get(node, 0) + 1
+            if parents[node] == 1:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+        return order, parents
+
+    def dag(self) -> tuple:
+        """
+        postorder(), cached on the node since expressions never change
+        """
+        if self.order is None:
+            self.order, self.parents = self.postorder()
+        return self.order, self.parents
+
+    def shared_nodes(self) -> list:
+        """
+        the inner nodes that are used more than once in the expression DAG, children before parents
+        """
+        order, parents = self.dag()
+        return [node for node in order if parents[node] > 1 and node.children()]
+
     def __add__(self, other):
         pass
 
@@ -44,6 +179,83 @@ class Expression:
     def __pow__(self, power: float, modulo=None):
         pass
 
+    def get_variables(self) -> set:
+        """
+        the names of the variables, collected from the leaves of the DAG once
+        """
+        if self.variables is None:
+            self.variables = frozenset().union(*(node.get_variables() for node in self.dag()[0]
+                                                 if not node.children()))
+        return set(self.variables)
+
+    def to_source(self, args: dict) -> str:
+        pass
+
+    def evaluate_chunk(self, columns, pool: BufferPool) -> tuple:
+        if self in columns:
+            return columns[self], False
+        return self.compute_chunk(columns, pool)
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        pass
+
+    def evaluate_batch(self, columns, chunk_size: int = 1 << 16, out: np.ndarray = None) -> np.ndarray:
+        """
+        evaluate the expression on many points at once with numpy ufuncs.
+        columns maps every variable name to an array of values (a dict, a structured array or a DataFrame).
+        the points are processed chunk_size at a time with reused scratch buffers, so columns and out may be
+        memory mapped arrays larger than memory. shared subexpressions are evaluated once per chunk.
+        """
+        names = sorted(self.get_variables())
+        shared = self.shared_nodes()
+        size = len(columns[names[0]]) if names else len(out) if out is not None else 1
+        if out is None:
+            out = np.empty(size)
+        pool = BufferPool(min(chunk_size, size))
+        for start in range(0, size, chunk_size):
+            stop = min(start + chunk_size, size)
+            if stop - start != pool.size:
+                pool = BufferPool(stop - start)
+            chunk = {name: np.asarray(columns[name][start:stop], dtype=np.float64) for name in names}
+            # shared subexpressions are computed once per chunk and read by all their parents
+            held = []
+            for node in shared:
+                value, owned = node.compute_chunk(chunk, pool)
+                chunk[node] = value
+                if owned:
+                    held.append(value)
+            value, owned = self.evaluate_chunk(chunk, pool)
+            out[start:stop] = value
+            if owned:
+                pool.release(value)
+            for buffer in held:
+                pool.release(buffer)
+        return out
+
+    def compile(self, variables: list = None):
+        """
+        lower the expression once into a flat python function that takes the variable values as
+        positional arguments, in the order of variables (default: sorted variable names).
+        every inner node is assigned to its own local, so shared subexpressions are computed once per call and
+        deep expressions do not hit the parser's nesting limit.
+        """
+        if variables is None:
+            names = sorted(self.get_variables())
+        else:
+            names = [v if isinstance(v, str) else v.get_name() for v in variables]
+        args = {name: f"a{i}" for i, name in enumerate(names)}
+        lines = [f"def compiled({', '.join(args.values())}):"]
+        inner = [node for node in self.dag()[0] if node.children()]
+        for i, node in enumerate(inner):
+            lines.append(f"    t{i} = {node.to_source(args)}")
+            args[node] = f"t{i}"
+        lines.append(f"    return {self.to_source(args)}")
+        namespace = {}
+        exec('\n'.join(lines), namespace)
+        func = namespace['compiled']
+        func.variables = names
+        return func
+
 class ValueAssignment(Assignment):
     def __init__(self, v:Variable, value:float):
         self.v=v
@@ -78,20 +290,38 @@ class Constant(Expression):
 
     def __init__(self, value: float=0.0):
         self.value = value
-    def evaluate(self, assgms: Assignments) -> float:
+
+    @classmethod
+    def intern_key(cls, value: float=0.0) -> tuple:
+        # 1 and 1.0 are kept apart so a node's value keeps the type it was built with
+        return cls, type(value), value
+
+    def children(self) -> tuple:
+        return ()
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
         return self.value
 
-    def derivative(self, v: Variable):
-        return float(0)
+    def compute_derivative(self, v: Variable):
+        return Constant(float(0))
 
     def __repr__(self) -> str:
         return str(self.get_value())
     def get_value(self):
         return float(self.value)
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
-        return self.value == other.value
+
+    def get_variables(self) -> set:
+        return set()
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return self.value, False
+
+    def to_source(self, args: dict) -> str:
+        # plain python numbers, numpy scalars repr as np.float64(..) which the compiled namespace lacks
+        value = int(self.value) if isinstance(self.value, (int, np.integer)) else float(self.value)
+        if not math.isfinite(value):
+            return f"float('{value}')"
+        return f"({value!r})"
 
     def __add__(self, other):
         return Addition(self,other)
@@ -108,14 +338,30 @@ class Constant(Expression):
 class VariableExpression(Variable,Expression):
     def __init__(self, variable_name):
         self.variable_name=variable_name
+
+    @classmethod
+    def intern_key(cls, variable_name) -> tuple:
+        return cls, variable_name
+
+    def children(self) -> tuple:
+        return ()
     
     def get_name(self):
         return self.variable_name
     
-    def evaluate(self, assgms: Assignments) -> float:
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
         return assgms[self.variable_name]
 
-    def derivative(self, v: Variable):
+    def get_variables(self) -> set:
+        return {self.variable_name}
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return columns[self.variable_name], False
+
+    def to_source(self, args: dict) -> str:
+        return args[self.variable_name]
+
+    def compute_derivative(self, v: Variable):
         if v.get_name()==self.get_name():
             return Constant(float(1))
         return Constant(float(0))
@@ -123,9 +369,6 @@ class VariableExpression(Variable,Expression):
     def __repr__(self) -> str:
         return self.variable_name
 
-    def __eq__(self, other):
-        return self.variable_name==other.variable_name
-
     def __add__(self, other):
         return Addition(self,other)
 
@@ -143,19 +386,30 @@ class Addition(Expression):
         self.A=A
         self.B=B
 
-    def evaluate(self, assgms: Assignments) -> float:
-        return self.A.evaluate(assgms) + self.B.evaluate(assgms)        
+    @classmethod
+    def intern_key(cls, A: Expression, B: Expression) -> tuple:
+        return cls, A, B
 
-    def derivative(self, v: Variable):
+    def children(self) -> tuple:
+        return self.A, self.B
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
+        return values[self.A] + values[self.B]        
+
+    def compute_derivative(self, v: Variable):
         return Addition(self.A.derivative(v), self.B.derivative(v))
 
     def __repr__(self) -> str:
         return f"({self.A}+{self.B})"
 
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
-        
+    def to_source(self, args: dict) -> str:
+        if self in args:
+            return args[self]
+        return f"({self.A.to_source(args)} + {self.B.to_source(args)})"
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return batch_ufunc(np.add, self.A.evaluate_chunk(columns, pool), self.B.evaluate_chunk(columns, pool), pool)
+
     def __add__(self, other):
         return Addition(self,other)
 
@@ -173,18 +427,29 @@ class Subtraction(Expression):
         self.A=A
         self.B=B
 
-    def evaluate(self, assgms: Assignments) -> float:
-        return self.A.evaluate(assgms) - self.B.evaluate(assgms) 
+    @classmethod
+    def intern_key(cls, A: Expression, B: Expression) -> tuple:
+        return cls, A, B
 
-    def derivative(self, v: Variable):
+    def children(self) -> tuple:
+        return self.A, self.B
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
+        return values[self.A] - values[self.B] 
+
+    def compute_derivative(self, v: Variable):
         return Subtraction(self.A.derivative(v), self.B.derivative(v))
 
     def __repr__(self) -> str:
         return f"({self.A}-{self.B})"
 
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
+    def to_source(self, args: dict) -> str:
+        if self in args:
+            return args[self]
+        return f"({self.A.to_source(args)} - {self.B.to_source(args)})"
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return batch_ufunc(np.subtract, self.A.evaluate_chunk(columns, pool), self.B.evaluate_chunk(columns, pool), pool)
 
     def __sub__(self, other):
         return Subtraction(self,other)
@@ -202,20 +467,31 @@ class Multiplication(Expression):
     def __init__(self, A: Expression, B: Expression):
         self.A=A
         self.B=B
+
+    @classmethod
+    def intern_key(cls, A: Expression, B: Expression) -> tuple:
+        return cls, A, B
+
+    def children(self) -> tuple:
+        return self.A, self.B
     
-    def evaluate(self, assgms: Assignments) -> float:
-        return self.A.evaluate(assgms) * self.B.evaluate(assgms) 
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
+        return values[self.A] * values[self.B] 
 
-    def derivative(self, v: Variable):
+    def compute_derivative(self, v: Variable):
         return Addition(Multiplication(self.A.derivative(v),self.B),Multiplication(
          self.A,self.B.derivative(v)))
 
     def __repr__(self) -> str:
         return f"({self.A}*{self.B})"
 
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
+    def to_source(self, args: dict) -> str:
+        if self in args:
+            return args[self]
+        return f"({self.A.to_source(args)} * {self.B.to_source(args)})"
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return batch_ufunc(np.multiply, self.A.evaluate_chunk(columns, pool), self.B.evaluate_chunk(columns, pool), pool)
 
     def __mul__(self, other):
         return Multiplication(self,other)
@@ -234,19 +510,30 @@ class Power(Expression):
         self.exp=exp
         self.p=Constant(p)
 
-    def evaluate(self, assgms: Assignments) -> float:
-        return self.exp.evaluate(assgms) ** self.p.evaluate(assgms)
+    @classmethod
+    def intern_key(cls, exp: Expression, p: float) -> tuple:
+        return cls, exp, type(p), p
 
-    def derivative(self, v: Variable):
+    def children(self) -> tuple:
+        return self.exp, self.p
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
+        return values[self.exp] ** values[self.p]
+
+    def compute_derivative(self, v: Variable):
         return Multiplication(Multiplication(self.p,Power(self.exp,self.p.get_value()-1)),self.exp.derivative(v))
 
     def __repr__(self) -> str:
         return f"({self.exp}^{self.p})"
 
+    def to_source(self, args: dict) -> str:
+        if self in args:
+            return args[self]
+        return f"({self.exp.to_source(args)} ** {self.p.to_source(args)})"
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        return batch_ufunc(np.power, self.exp.evaluate_chunk(columns, pool), self.p.evaluate_chunk(columns, pool), pool)
 
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
 
     def __mul__(self, other):
         return Multiplication(self,other)
@@ -263,19 +550,43 @@ class Power(Expression):
 class Polynomial(Expression):
     def __init__(self, v: Variable, coefs: list):
         self.v=v
-        self.coefs=coefs
+        # a copy, the node is shared and the caller may change its list
+        self.coefs=list(coefs)
 
-    def evaluate(self, assgms: Assignments) -> float:
-        return self.coefs[2] * Power(self.v,2).evaluate(assgms) + self.coefs[1] * self.v.evaluate(assgms) + self.coefs[0]
+    @classmethod
+    def intern_key(cls, v: Variable, coefs: list) -> tuple:
+        return cls, v, tuple((type(c), c) for c in coefs)
 
-    def derivative(self, v: Variable):
+    def children(self) -> tuple:
+        return (self.v,)
+
+    def __reduce__(self):
+        return Polynomial, (self.v, self.coefs)
+
+    def compute_value(self, assgms: Assignments, values: dict) -> float:
+        return self.coefs[2] * values[self.v] ** 2 + self.coefs[1] * values[self.v] + self.coefs[0]
+
+    def to_source(self, args: dict) -> str:
+        if self in args:
+            return args[self]
+        x = self.v.to_source(args)
+        c0, c1, c2 = (Constant(c).to_source(args) for c in self.coefs[:3])
+        return f"({c2} * ({x} ** 2) + {c1} * {x} + {c0})"
+
+    def compute_chunk(self, columns, pool: BufferPool) -> tuple:
+        x = self.v.evaluate_chunk(columns, pool)
+        square = batch_ufunc(np.multiply, batch_ufunc(np.power, x, (2, False), pool), (self.coefs[2], False), pool)
+        linear = batch_ufunc(np.multiply, x, (self.coefs[1], False), pool)
+        return batch_ufunc(np.add, batch_ufunc(np.add, square, linear, pool), (self.coefs[0], False), pool)
+
+    def compute_derivative(self, v: Variable):
         if self.v == v:
             if self.coefs[2]==0:
-                return self.coefs[1]
+                return Constant(self.coefs[1])
             elif self.coefs[1]==0:
                 return Polynomial(self.v,[0,0,2*self.coefs[2]])
             return Polynomial(self.v,[self.coefs[1],2*self.coefs[2],0])
-        return float(0)
+        return Constant(float(0))
 
 
     def __repr__(self) -> str:
@@ -297,10 +608,6 @@ class Polynomial(Expression):
         return "(" + first + second + last + ")"
 
 
-    def __eq__(self, other):
-        if type(self) != type(other):
-            return False
-
     def __add__(self, other):
         return Addition(self,other)
 
@@ -0,0 +1,39 @@
+import importlib.util
+import os
+import sys
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(file_name, module_name):
+    """
+    import a project file by path (the file names are not valid module names)
+    :return: the module
+    """
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    # registered so pickling and the parallel backend workers can find its functions
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def mf():
+    return load_module('mathematical functions.py', 'mathematical_functions')
+
+
+@pytest.fixture(scope='session')
+def gol():
+    pytest.importorskip('game_of_life_interface')
+    pytest.importorskip('matplotlib')
+    return load_module('Game of Life.py', 'game_of_life')
+
+
+@pytest.fixture(scope='session')
+def pb():
+    pytest.importorskip('yfinance')
+    pytest.importorskip('pandas_datareader')
+    return load_module('PortfolioBuilder.py', 'PortfolioBuilder')
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+
+TWO_STATE_RULES = ['B3/S23', 'B36/S23', 'B2/S', 'B/S012345678', '23/36']
+GENERATIONS_RULES = ['B2/S/C3', '/2/3', '345/2/4']
+
+GOSPER_GUN = """x = 36, y = 9, rule = B3/S23
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4b
+obo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+
+def make_game(gol, size, rules, backend, board):
+    """
+    a game on the given start board, whatever way the backend stores it
+    """
+    np.random.seed(0)
+    kwargs = {'workers': 2} if backend == 'parallel' else {}
+    game = gol.GameOfLife(size, 0, rules, '', 0, backend=backend, **kwargs)
+    if backend == 'packed':
+        game.board = gol.pack_board(board)
+    elif backend == 'hashlife':
+        game.hashlife.root = game.hashlife.from_board(board)
+    elif backend == 'parallel':
+        game.board[:] = board
+    else:
+        game.board = board.copy()
+    return game
+
+
+@pytest.mark.parametrize('rules', TWO_STATE_RULES + GENERATIONS_RULES)
+def test_backends_match_the_loop(gol, rules):
+    size, generations = 32, 6
+    backends = ['numpy', 'sparse', 'parallel']
+    if rules in TWO_STATE_RULES:
+        backends += ['packed', 'hashlife']
+    np.random.seed(sum(map(ord, rules)))
+    board = np.random.choice([0, 255], (size, size), p=[0.6, 0.4])
+
+    reference = make_game(gol, size, rules, 'loop', board)
+    games = {backend: make_game(gol, size, rules, backend, board) for backend in backends}
+    try:
+        for _ in range(generations):
+            reference.update()
+            for backend, game in games.items():
+                game.update()
+                assert np.array_equal(np.asarray(game.dense_board()), reference.board), backend
+                assert game.population() == np.count_nonzero(reference.board), backend
+    finally:
+        games['parallel'].close()
+
+
+def test_packed_starts_match_the_dense_board(gol):
+    for size in (50, 64, 130):
+        for mode, rle, position in ((4, '', 0), (0, GOSPER_GUN, (3, 60)), (0, 'x = 90, y = 2\n90o$3b70o!', (1, 5))):
+            dense = gol.GameOfLife(size, mode, 'B3/S23', rle, position)
+            packed = gol.GameOfLife(size, mode, 'B3/S23', rle, position, backend='packed')
+            assert np.array_equal(packed.dense_board(), dense.board)
+            assert packed.population() == dense.population()
+
+
+def test_rle_header_keeps_commas_in_the_rule(gol):
+    header = gol.read_rle_header('x = 3, y = 3, rule = B36/S23:T100,100\nbo$2bo$3o!')
+    assert header == {'x': 3, 'y': 3, 'rule': 'B36/S23'}
+    with pytest.raises(ValueError):
+        gol.read_rle_header('x = 3, y = 3, rule = B3/S23:P10,10\nbo$2bo$3o!')
@@ -0,0 +1,77 @@
+import copy
+import pickle
+import numpy as np
+
+
+def assignments(mf, **values):
+    sda = mf.SimpleDictionaryAssignments()
+    for name, value in values.items():
+        sda += mf.ValueAssignment(mf.VariableExpression(name), value)
+    return sda
+
+
+def test_structurally_equal_expressions_are_one_node(mf):
+    x, y = mf.VariableExpression('x'), mf.VariableExpression('y')
+    assert (x + y) is (x + y)
+    assert (x + y) == mf.Addition(mf.VariableExpression('x'), mf.VariableExpression('y'))
+    assert (x + y) != (y + x)
+    assert mf.Constant(value=2.0) is mf.Constant(2.0)
+    assert mf.Constant(1) is not mf.Constant(1.0)
+    assert mf.Power(x, 2) is not mf.Power(x, 2.0)
+    assert mf.Polynomial(x, [1, 2, 3]) is not mf.Polynomial(x, [1.0, 2.0, 3.0])
+    assert type(mf.Constant(1).value) is int
+
+
+def test_copies_and_pickles_are_interned(mf):
+    x, y = mf.VariableExpression('x'), mf.VariableExpression('y')
+    for expression in (x, x + x, mf.Polynomial(x, [1, 2, 3]), ((x + y) * (x - y)) ** 3):
+        assert copy.copy(expression) is expression
+        assert copy.deepcopy(expression) is expression
+        assert pickle.loads(pickle.dumps(expression)) is expression
+
+
+def test_derivatives_are_memoized(mf):
+    x, y = mf.VariableExpression('x'), mf.VariableExpression('y')
+    expression = (x + y) * (x - y)
+    assert expression.derivative(x) is expression.derivative(x)
+    assert expression.derivative(x).derivative(x) is expression.derivative(x).derivative(x)
+
+
+def test_evaluate_compile_and_batch_agree(mf):
+    x, y = mf.VariableExpression('x'), mf.VariableExpression('y')
+    sda = assignments(mf, x=1.5, y=-2.25)
+    # (x^2 - y^2)^3 differentiated three times by x is 72x(x^2 - y^2) + 48x^3
+    expected = 72 * 1.5 * (1.5 ** 2 - 2.25 ** 2) + 48 * 1.5 ** 3
+    expression = ((x + y) * (x - y)) ** 3
+    for _ in range(3):
+        expression = expression.derivative(x)
+    assert np.isclose(expression.evaluate(sda), expected)
+    assert np.isclose(expression.compile()(1.5, -2.25), expected)
+    assert np.allclose(expression.evaluate_batch({'x': np.full(5, 1.5), 'y': np.full(5, -2.25)}), expected)
+
+    tree = (x * y + x) ** 2 - y
+    assert tree.evaluate(sda) == (1.5 * -2.25 + 1.5) ** 2 + 2.25
+
+
+def test_high_order_derivatives_stay_polynomial(mf):
+    x, y = mf.VariableExpression('x'), mf.VariableExpression('y')
+    expression = ((x + y) * (x - y)) ** 3
+    for _ in range(10):
+        expression = expression.derivative(x)
+    # the expanded tree has millions of nodes, the DAG about a thousand
+    assert len(expression.dag()[0]) < 5000
+    assert expression.get_variables() == {'x', 'y'}
+    points = {'x': np.linspace(2, 3, 10), 'y': np.linspace(-1, 0, 10)}
+    compiled = expression.compile()
+    batch = expression.evaluate_batch(points)
+    assert np.allclose(batch, [compiled(a, b) for a, b in zip(points['x'], points['y'])], equal_nan=True)
+
+
+def test_deep_chains_compile(mf):
+    x = mf.VariableExpression('x')
+    expression = x
+    for i in range(300):
+        expression = expression + mf.Constant(float(i))
+    assert expression.compile()(1.0) == 1 + sum(range(300))
+    assert expression.evaluate(assignments(mf, x=1.0)) == 1 + sum(range(300))
+    assert (mf.Constant(np.float64(2.5)) * x).compile()(2.0) == 5.0
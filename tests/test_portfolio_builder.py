@@ -0,0 +1,68 @@
+from datetime import date
+import numpy as np
+
+
+def price_relatives(pb, tickers, start, end, volatility=0.2, correlation=0.3):
+    prices = pb.SyntheticDataSource(volatility=volatility, correlation=correlation, seed=3).fetch(
+        tickers, start, end).values
+    return prices[1:] / prices[:-1]
+
+
+def test_sampled_universal_wealth_converges(pb):
+    x_vec = price_relatives(pb, ['A', 'B', 'C'], date(2019, 1, 1), date(2020, 1, 1))
+    exact = pb.universal_wealth(x_vec, pb.simplex_grid(3, 150, np.float64))
+    errors = [np.abs(np.log(pb.sampled_universal_wealth(x_vec, samples, seed=1) / exact)).max()
+              for samples in (100, 100000)]
+    assert errors[1] < 0.01
+    assert errors[1] < errors[0]
+
+
+def test_sampled_universal_wealth_with_mcmc_stays_close(pb):
+    # years of volatile independent prices concentrate the wealth, so the particles get resampled and moved
+    x_vec = price_relatives(pb, ['A', 'B', 'C'], date(2000, 1, 1), date(2010, 1, 1), volatility=3.0, correlation=0.0)
+    exact = pb.universal_wealth(x_vec, pb.simplex_grid(3, 300, np.float64))
+    sampled = pb.sampled_universal_wealth(x_vec, 5000, seed=1, mcmc_steps=5)
+    assert np.abs(np.log(sampled / exact)).max() < 0.06
+
+
+class CountingSource:
+    def __init__(self, source):
+        self.source = source
+        self.calls = []
+
+    def fetch(self, tickers_list, start_date, end_date):
+        self.calls.append((tuple(tickers_list), start_date, end_date))
+        return self.source.fetch(tickers_list, start_date, end_date)
+
+
+def test_price_cache_fills_gaps_and_reuses_cached_ranges(pb, tmp_path):
+    synthetic = pb.SyntheticDataSource(seed=5)
+    source = CountingSource(synthetic)
+    builder = pb.PortfolioBuilder(source, str(tmp_path))
+    tickers = ['A', 'B']
+    builder.get_daily_data(tickers, date(2020, 6, 1), date(2020, 6, 30))
+    builder.get_daily_data(tickers, date(2020, 1, 1), date(2020, 1, 31))
+    # the gap between the two requests was fetched along with january
+    calls = len(source.calls)
+    march = builder.get_daily_data(tickers, date(2020, 3, 1), date(2020, 3, 31))
+    assert len(source.calls) == calls
+    expected = synthetic.fetch(tickers, date(2020, 3, 1), date(2020, 3, 31))
+    assert np.allclose(march.values, expected.values)
+    assert (march.index == expected.index).all()
+
+    # a wider request only fetches what lies outside the cached range
+    builder.get_daily_data(tickers + ['C'], date(2019, 12, 1), date(2020, 7, 31))
+    assert sorted(source.calls[calls:]) == sorted([
+        (('A', 'B'), date(2019, 12, 1), date(2019, 12, 31)), (('A', 'B'), date(2020, 7, 1), date(2020, 7, 31)),
+        (('C',), date(2019, 12, 1), date(2020, 7, 31))])
+
+
+def test_csv_source_matches_the_cache(pb, tmp_path):
+    prices = pb.SyntheticDataSource(seed=6).fetch(['A', 'B'], date(2020, 1, 1), date(2020, 12, 31))
+    prices.index.name = 'Date'
+    prices.to_csv(tmp_path / 'prices.csv')
+    source = pb.CsvDataSource(str(tmp_path / 'prices.csv'))
+    cached = pb.PortfolioBuilder(source, str(tmp_path / 'cache'))
+    cached.get_daily_data(['A', 'B'], date(2020, 3, 1), date(2020, 5, 1))
+    data = cached.get_daily_data(['A', 'B'], date(2020, 1, 1), date(2020, 12, 31))
+    assert np.allclose(data.values, prices.values)